@@ -0,0 +1,157 @@
+"""
+Benchmark du moteur Python (public/python/generate_web.py) sur des communes synthétiques
+Chronomètre chaque étape à plusieurs échelles et écrit un rapport JSON comparable entre versions
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from create_demo_data import generer_commune
+
+RACINE = os.path.dirname(os.path.abspath(__file__))
+MOTEUR = os.path.join(RACINE, "public", "python")
+
+# Étapes relevées par Progression, dans l'ordre du pipeline (fusion absente avec --sans-fusion)
+ETAPES = ("chargement", "controle", "geometrie", "planification", "modeles", "rendu", "fusion")
+
+# Sous-étapes cumulées par Profilage : chargement Excel et rendu seul en sont déduits
+SOUS_ETAPES = ("nettoyage_ids", "recherche_coordonnees", "remplissage_tableaux", "sauvegarde", "zip",
+               "ajout_fusion")
+
+# Part de parcelles collectives dans une commune synthétique
+PART_COLLECTIVES = 0.2
+
+# Baisse de débit (docs/s) au-delà de laquelle --reference signale une régression
+SEUIL_REGRESSION = 0.10
+
+def mesurer(dossier, sortie, rendu, fusionner=True):
+    """Exécute generer_extraits sur `dossier` dans le processus courant, sans cache des classeurs ;
+    retourne le débit, les durées par étape (relevées par Progression), par sous-étape et par
+    parcelle (Profilage)"""
+    sys.path.insert(0, MOTEUR)
+    import generate_web as gw
+
+    progression = gw.Progression()
+    profilage = gw.Profilage()
+    debut = time.perf_counter()
+    gw.generer_extraits(gw.fichiers_entree(dossier), sortie, fusionner=fusionner, progression=progression,
+                        arret_sur_anomalie=False, rendu=rendu, profilage=profilage)
+    total = time.perf_counter() - debut
+
+    nb_docs = progression.faits['PI'] + progression.faits['PC']
+    parcelles = sorted(duree for duree, _, _ in profilage.parcelles)
+    etapes = {etape: progression.etapes[etape]['duree_s'] for etape in ETAPES if etape in progression.etapes}
+    sous_etapes = {nom: profilage.sous_etapes.get(nom, 0.0) for nom in SOUS_ETAPES}
+    # Ce qui reste du chargement une fois les NICAD nettoyés, du rendu hors tableaux, sauvegarde et archive
+    details = {
+        "chargement_excel": etapes["chargement"] - sous_etapes["nettoyage_ids"],
+        "rendu_seul": etapes["rendu"] - sum(sous_etapes[nom] for nom in SOUS_ETAPES[1:]),
+        **sous_etapes,
+    }
+    return {
+        "documents": nb_docs,
+        "rendu": rendu,
+        "fusion": fusionner,
+        "duree_totale_s": round(total, 4),
+        "docs_par_seconde": round(nb_docs / total, 2) if total else None,
+        "memoire_max_mo": gw.memoire_max_mo(),
+        "etapes_s": etapes,
+        "sous_etapes_s": {nom: round(duree, 4) for nom, duree in details.items()},
+        "parcelle_mediane_ms": round(parcelles[len(parcelles) // 2] * 1000, 2) if parcelles else None,
+        "parcelle_p95_ms": round(parcelles[int(len(parcelles) * 0.95)] * 1000, 2) if parcelles else None,
+        "version_rendu": gw.VERSION_RENDU,
+    }
+
+def version_code():
+    """Commit courant du dépôt, pour situer le rapport"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RACINE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def executer(echelles, dossier_donnees, sommets, graine, rendu, fusionner=True):
+    """Une commune par échelle, mesurée dans un processus neuf (pic mémoire propre à l'échelle)"""
+    resultats = []
+    for echelle in echelles:
+        nb_coll = int(echelle * PART_COLLECTIVES)
+        dossier = os.path.join(dossier_donnees, f"commune_{echelle}")
+        if not os.path.exists(os.path.join(dossier, "INDIV.xlsx")):
+            print(f"🏗️  Génération de la commune synthétique ({echelle} parcelles)...")
+            generer_commune(dossier, echelle - nb_coll, nb_coll, sommets, graine=graine, modeles=RACINE)
+
+        print(f"⏱️  Mesure à {echelle} parcelles...")
+        sortie = os.path.join(dossier, "sortie")
+        os.makedirs(sortie, exist_ok=True)
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--mesurer", dossier, sortie, rendu,
+                               str(int(fusionner))], capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr)
+            raise SystemExit(f"❌ Échec de la mesure à {echelle} parcelles")
+        mesure = json.loads(proc.stdout.strip().splitlines()[-1])
+        mesure["parcelles"] = echelle
+        print(f"   ✓ {mesure['docs_par_seconde']} docs/s, pic mémoire {mesure['memoire_max_mo']} Mo")
+        resultats.append(mesure)
+    return resultats
+
+def comparer(rapport, reference, seuil=SEUIL_REGRESSION):
+    """Compare les débits à un rapport de référence ; retourne le nombre de régressions"""
+    anciens = {m["parcelles"]: m for m in reference["mesures"]}
+    regressions = 0
+    for mesure in rapport["mesures"]:
+        ancien = anciens.get(mesure["parcelles"])
+        # Débits comparables seulement à moteur de rendu et fusion identiques
+        if (not ancien or not ancien["docs_par_seconde"]
+                or (ancien.get("rendu"), ancien.get("fusion")) != (mesure["rendu"], mesure["fusion"])):
+            continue
+        ratio = mesure["docs_par_seconde"] / ancien["docs_par_seconde"]
+        regression = ratio < 1 - seuil
+        regressions += regression
+        print(f"   {'❌' if regression else '✓'} {mesure['parcelles']} parcelles : "
+              f"{ancien['docs_par_seconde']} → {mesure['docs_par_seconde']} docs/s ({ratio:.2f}x)")
+    return regressions
+
+if __name__ == "__main__":
+    if len(sys.argv) == 6 and sys.argv[1] == "--mesurer":
+        # Processus enfant : une seule mesure, résultat JSON sur la dernière ligne
+        print(json.dumps(mesurer(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5] == "1")))
+        sys.exit(0)
+
+    from create_demo_data import lire_repartition
+
+    parser = argparse.ArgumentParser(description="Benchmark du moteur de génération des extraits")
+    parser.add_argument("--echelles", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Nombres de parcelles à mesurer")
+    parser.add_argument("--donnees", default=os.path.join(RACINE, "bench_donnees"),
+                        help="Dossier des communes synthétiques (réutilisées d'un run à l'autre)")
+    parser.add_argument("--sommets", type=lire_repartition, default=(4, 8, 40),
+                        help="Nombre de sommets par parcelle, loi triangulaire MIN:MODE:MAX")
+    parser.add_argument("--graine", type=int, default=2024)
+    parser.add_argument("--rendu", choices=("docx", "xml"), default="docx", help="Moteur de rendu mesuré")
+    parser.add_argument("--sans-fusion", dest="fusionner", action="store_false",
+                        help="Ne mesure pas les documents fusionnés")
+    parser.add_argument("--sortie", default="benchmark_resultats.json", help="Rapport JSON")
+    parser.add_argument("--reference", help="Rapport JSON d'une version précédente à comparer")
+    args = parser.parse_args()
+
+    rapport = {
+        "version": version_code(),
+        "python": platform.python_version(),
+        "plateforme": platform.platform(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mesures": executer(args.echelles, args.donnees, args.sommets, args.graine, args.rendu, args.fusionner),
+    }
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump(rapport, f, indent=2, ensure_ascii=False)
+    print(f"\n✅ Rapport écrit : {args.sortie}")
+
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            reference = json.load(f)
+        print(f"\n📊 Comparaison avec {reference.get('version') or args.reference}")
+        sys.exit(1 if comparer(rapport, reference) else 0)
@@ -0,0 +1,110 @@
+"""
+Script pour générer une commune de démonstration (classeurs + modèles) à l'échelle voulue
+Données synthétiques reproductibles (graine fixe) pour les tests de charge et le benchmark
+"""
+
+import argparse
+import math
+import os
+import random
+import shutil
+
+from openpyxl import Workbook
+
+PRENOMS = ["Awa", "Moussa", "Fatou", "Mamadou", "Aminata", "Ibrahima", "Khady", "Cheikh", "Mariama", "Ousmane"]
+NOMS = ["Diop", "Ndiaye", "Fall", "Sow", "Gueye", "Ba", "Sarr", "Faye", "Diallo", "Cissé"]
+VILLAGES = ["Ndiaye", "Keur Massar", "Thiès", "Sangalkam", "Bambilor", "Diamniadio"]
+USAGES = ["Habitation", "Agricole", "Commerce", "Maraîchage"]
+
+# Modèles de démonstration (create_demo_templates.py) → noms attendus par le moteur
+MODELES = {
+    "DEMO_MODELE_INDIVIDUEL.docx": "Template_Indiv.docx",
+    "DEMO_MODELE_COLLECTIF.docx": "Template_Coll.docx",
+}
+
+def lire_repartition(texte):
+    """'MIN:MODE:MAX' → (min, mode, max) pour une loi triangulaire du nombre de sommets"""
+    mini, mode, maxi = (int(v) for v in texte.split(":"))
+    if not 3 <= mini <= mode <= maxi:
+        raise argparse.ArgumentTypeError("attendu MIN:MODE:MAX avec 3 <= MIN <= MODE <= MAX")
+    return mini, mode, maxi
+
+def polygone(rng, repartition, centre):
+    """Polygone simple (angles triés) autour d'un centroïde UTM ; retourne (sommets, aire)"""
+    mini, mode, maxi = repartition
+    nb = int(round(rng.triangular(mini, maxi, mode)))
+    rayon = rng.uniform(8, 60)
+    angles = sorted(rng.uniform(0, 2 * math.pi) for _ in range(nb))
+    sommets = [(centre[0] + rayon * rng.uniform(0.7, 1.0) * math.cos(a),
+                centre[1] + rayon * rng.uniform(0.7, 1.0) * math.sin(a)) for a in angles]
+    aire = abs(sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(sommets, sommets[1:] + sommets[:1]))) / 2
+    return sommets, aire
+
+def ecrire_classeur(chemin, entetes, lignes):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(entetes)
+    for ligne in lignes:
+        ws.append(ligne)
+    wb.save(chemin)
+
+def generer_commune(dossier, nb_individuelles=100, nb_collectives=20, sommets=(4, 8, 40),
+                    beneficiaires=(2, 12), graine=2024, modeles="."):
+    """Écrit INDIV/COLL/COORDS_PI/COORDS_PC.xlsx et les deux modèles dans `dossier`"""
+    rng = random.Random(graine)
+    os.makedirs(dossier, exist_ok=True)
+
+    indiv, coords_pi = [], []
+    for i in range(nb_individuelles):
+        nicad = f"{1000000000000 + i}"
+        village = rng.choice(VILLAGES)
+        sommets_pi, aire = polygone(rng, sommets, (rng.uniform(3e5, 4e5), rng.uniform(1.6e6, 1.7e6)))
+        indiv.append([nicad, rng.choice(PRENOMS), rng.choice(NOMS), round(aire, 2), village,
+                      rng.choice(USAGES), f"1{rng.randrange(10 ** 12):012d}", "CNI",
+                      f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1950, 2000)}",
+                      770000000 + rng.randrange(10 ** 7)])
+        # Les sommets arrivent dans le désordre, comme dans les exports SIG
+        coords_pi.extend([nicad, v + 1, x, y] for v, (x, y) in enumerate(sommets_pi))
+    rng.shuffle(coords_pi)
+
+    coll, coords_pc = [], []
+    for i in range(nb_collectives):
+        nicad = str(2000000000000 + i)
+        sommets_pc, aire = polygone(rng, sommets, (rng.uniform(3e5, 4e5), rng.uniform(1.6e6, 1.7e6)))
+        nb = rng.randint(*beneficiaires)
+        coll.append([nicad, round(aire, 2), rng.choice(VILLAGES), rng.choice(USAGES),
+                     "\n".join(rng.choice(PRENOMS) for _ in range(nb)),
+                     "\n".join(rng.choice(NOMS) for _ in range(nb)),
+                     "\n".join(f"2{rng.randrange(10 ** 12):012d}" for _ in range(nb))])
+        coords_pc.extend([nicad, v + 1, x, y] for v, (x, y) in enumerate(sommets_pc))
+    rng.shuffle(coords_pc)
+
+    ecrire_classeur(os.path.join(dossier, "INDIV.xlsx"),
+                    ["nicad", "Prenom", "Nom", "superficie", "Village", "type_usag", "Num_piece",
+                     "Type_piece", "Date_naissance", "Telephone"], indiv)
+    ecrire_classeur(os.path.join(dossier, "COLL.xlsx"),
+                    ["nicad", "superficie", "Village", "type_usa", "Prenom", "Nom", "Numero_piece"], coll)
+    ecrire_classeur(os.path.join(dossier, "COORDS_PI.xlsx"), ["nicad", "vertex_index", "X", "Y"], coords_pi)
+    ecrire_classeur(os.path.join(dossier, "COORDS_PC.xlsx"), ["nicad", "vertex_index", "X", "Y"], coords_pc)
+    for source, cible in MODELES.items():
+        shutil.copyfile(os.path.join(modeles, source), os.path.join(dossier, cible))
+    return dossier
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère une commune synthétique pour le moteur Python")
+    parser.add_argument("dossier", help="Dossier de sortie (utilisable comme --entree)")
+    parser.add_argument("--individuelles", type=int, default=100, help="Nombre de parcelles individuelles")
+    parser.add_argument("--collectives", type=int, default=20, help="Nombre de parcelles collectives")
+    parser.add_argument("--sommets", type=lire_repartition, default=(4, 8, 40),
+                        help="Nombre de sommets par parcelle, loi triangulaire MIN:MODE:MAX")
+    parser.add_argument("--beneficiaires", type=int, nargs=2, default=(2, 12), metavar=("MIN", "MAX"),
+                        help="Nombre de bénéficiaires par parcelle collective")
+    parser.add_argument("--graine", type=int, default=2024, help="Graine du générateur aléatoire")
+    parser.add_argument("--modeles", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Dossier contenant les DEMO_MODELE_*.docx")
+    args = parser.parse_args()
+
+    generer_commune(args.dossier, args.individuelles, args.collectives, args.sommets,
+                    tuple(args.beneficiaires), args.graine, args.modeles)
+    print(f"✅ Commune générée dans {args.dossier} "
+          f"({args.individuelles} individuelles, {args.collectives} collectives)")
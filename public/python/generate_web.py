@@ -3,34 +3,128 @@ Moteur de génération des Extraits de Délibération - Version Web (Pyodide)
 Adapté pour fonctionner dans un navigateur via WebAssembly.
 """
 
-import pandas as pd
 from docx import Document
 from docx.shared import Pt, Cm
 from docx.enum.text import WD_LINE_SPACING
 from docx.enum.table import WD_TABLE_ALIGNMENT
 from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from array import array
+from itertools import islice
+import argparse
+import asyncio
+import collections
+import contextlib
+import copy
+import cProfile
+import hashlib
+import io
+import json
+import marshal
+import math
 import os
+import pickle
+import pstats
 import re
-import shutil
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import unicodedata
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
 
 # === CHEMINS VIRTUELS PYODIDE ===
 INPUT_DIR = "/input"
 OUTPUT_DIR = "/output"
 
-# Fichiers attendus
-FILE_INDIV_DELIB = f"{INPUT_DIR}/INDIV.xlsx"
-FILE_COLL_DELIB = f"{INPUT_DIR}/COLL.xlsx"
-FILE_COORD_PI = f"{INPUT_DIR}/COORDS_PI.xlsx"
-FILE_COORD_PC = f"{INPUT_DIR}/COORDS_PC.xlsx"
-TEMPLATE_INDIV = f"{INPUT_DIR}/Template_Indiv.docx"
-TEMPLATE_COLL = f"{INPUT_DIR}/Template_Coll.docx"
+# Fichiers attendus (noms relatifs au dossier d'entrée, mêmes clés que le FileSet JS)
+NOMS_FICHIERS = {
+    'indiv': "INDIV.xlsx", 'coll': "COLL.xlsx",
+    'coord_pi': "COORDS_PI.xlsx", 'coord_pc': "COORDS_PC.xlsx",
+    'tpl_indiv': "Template_Indiv.docx", 'tpl_coll': "Template_Coll.docx",
+}
+NOM_ZIP_RESULTAT = "Resultats_Extraits.zip"
+NOM_MANIFESTE = "manifeste_extraits.json"
+
+# Fichiers facultatifs : archive (et manifeste) d'un run précédent, pour la régénération incrémentale
+NOMS_FICHIERS_OPTIONNELS = {'zip_precedent': NOM_ZIP_RESULTAT}
+
+# Compression de l'archive : "stocker" (les .docx sont déjà compressés) ou "compresser"
+COMPRESSION_ZIP = "stocker"
+
+# Mode natif : nombre de parcelles envoyées à la fois à un processus de travail
+TAILLE_LOT = 50
+# Lots en vol par processus : au-delà, les rendus attendent que le parent (archive, fusion) les consomme
+LOTS_PAR_PROCESSUS = 2
+
+# Document "TOUS_LES_EXTRAITS_*.docx" par type, comme le moteur JS
+FUSIONNER = True
+NOMS_FUSION = {'PI': "TOUS_LES_EXTRAITS_INDIVIDUELS.docx", 'PC': "TOUS_LES_EXTRAITS_COLLECTIVES.docx"}
+
+# Coordonnées : lignes lues par bloc dans le classeur COORDS (mémoire bornée par bloc)
+TAILLE_BLOC_COORDS = 10000
+
+# Mode asynchrone : parcelles traitées entre deux retours à la boucle d'événements (page réactive)
+TAILLE_TRANCHE = 5
+
+# Cache des classeurs analysés, indexé par le contenu des fichiers. Sous Pyodide, le
+# dossier n'est utilisé que si l'hôte JS y a monté un IDBFS (et appelle FS.syncfs)
+DOSSIER_CACHE = "/cache" if sys.platform == "emscripten" else os.path.join(
+    os.path.expanduser("~"), ".cache", "procasef_extraits")
+TAILLE_MAX_CACHE_MO = 512
+
+# Événements de progression : intervalle minimal (secondes) entre deux événements "progression"
+CADENCE_PROGRESSION = 1.0
+
+# Contrôle préalable des entrées (jointures, doublons, colonnes, bénéficiaires) : avec
+# ARRET_SUR_ANOMALIE, une anomalie bloquante arrête la génération avant le rendu
+NOM_RAPPORT_CONTROLE = "controle_prealable.json"
+ARRET_SUR_ANOMALIE = False
+
+# Contrôle géométrique : écart relatif toléré entre l'aire calculée des sommets et la superficie déclarée
+TOLERANCE_SUPERFICIE = 0.05
+NOM_RAPPORT_GEOMETRIE = "controle_geometrie.json"
+
+# Rendu : "docx" (objets python-docx, puis doc.save) ou "xml" (document.xml assemblé
+# directement à partir du modèle découpé, autres parties du paquet recopiées telles quelles)
+MOTEUR_RENDU = "docx"
+
+# Extraits à la demande (guichet) : nombre de documents récemment rendus gardés en mémoire
+TAILLE_CACHE_EXTRAITS = 32
+
+# Profilage (facultatif) : nombre de parcelles, fonctions et sites d'allocation retenus dans le rapport
+TOP_PROFIL = 20
+NOM_RAPPORT_PROFIL = "profil_generation.json"
+NOM_STATS_PROFIL = "profil_generation.pstats"
+
+# Chargement des classeurs : "leger" (openpyxl en lecture seule, sans pandas ni numpy,
+# démarrage rapide sous Pyodide) ou "pandas" (pandas.read_excel + passes numpy)
+CHARGEUR = "leger"
+
+# Type d'extrait → dossier dans l'archive
+DOSSIERS = {'PI': "Individuelles", 'PC': "Collectives"}
 
 def log(msg):
     print(msg)
 
+def fichiers_entree(dossier=INPUT_DIR, **chemins):
+    """Chemins des fichiers d'entrée ; chaque clé de NOMS_FICHIERS(_OPTIONNELS) peut être surchargée"""
+    noms = {**NOMS_FICHIERS, **NOMS_FICHIERS_OPTIONNELS}
+    return {cle: chemins.get(cle) or os.path.join(dossier, nom) for cle, nom in noms.items()}
+
+def est_nul(x):
+    """Équivalent de pd.isnull pour une valeur isolée, sans importer pandas"""
+    try:
+        return bool(x is None or x != x)
+    except TypeError:
+        return True
+
 def clean_id(x):
     """Nettoie les identifiants NICAD pour éviter les problèmes de correspondance (123.0 vs 123)"""
-    if pd.isnull(x): return ""
+    if est_nul(x): return ""
     try:
         if isinstance(x, float) and x.is_integer():
             return str(int(x)).strip()
@@ -38,6 +132,211 @@ def clean_id(x):
     except:
         return str(x).strip()
 
+# === PRÉPARATION DES DONNÉES ===
+# Champ du modèle → colonne du classeur
+CHAMPS_INDIV = (
+    ('«Prenom»', 'Prenom'), ('«Nom»', 'Nom'),
+    ('«nicad»', 'nicad'), ('«superficie»', 'superficie'),
+    ('«Village»', 'Village'), ('«type_usag»', 'type_usag'),
+    ('«Num_piece»', 'Num_piece'), ('«Type_piece»', 'Type_piece'),
+    ('«Date_naissance»', 'Date_naissance'), ('«Telephone»', 'Telephone'),
+)
+CHAMPS_COLL = (
+    ('«nicad»', 'nicad'), ('«superficie»', 'superficie'),
+    ('«Village»', 'Village'), ('«type_usa»', 'type_usa'),
+    ('«Num_piece»', 'Numero_piece'),
+)
+
+def _ids_flottants(valeurs):
+    """clean_id appliqué à un tableau numpy de flottants"""
+    import numpy as np
+    resultat = np.full(len(valeurs), "", dtype=object)
+    nuls = np.isnan(valeurs)
+    entiers = ~nuls & np.isfinite(valeurs)
+    entiers[entiers] = np.mod(valeurs[entiers], 1) == 0
+    petits = entiers & (np.abs(valeurs) < 2 ** 63)
+    resultat[petits] = valeurs[petits].astype(np.int64).astype(str).tolist()
+    grands = entiers & ~petits
+    resultat[grands] = [str(int(v)) for v in valeurs[grands].tolist()]
+    autres = ~nuls & ~entiers
+    resultat[autres] = valeurs[autres].astype(str).tolist()
+    return resultat
+
+def nettoyer_ids(serie):
+    """Version vectorisée de clean_id sur une colonne entière"""
+    import numpy as np
+    import pandas as pd
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_integer_dtype(serie):
+        return serie.astype(str)
+    if pd.api.types.is_float_dtype(serie):
+        return pd.Series(_ids_flottants(serie.to_numpy(dtype=float)), index=serie.index)
+
+    # Colonne mixte : les flottants suivent la règle 123.0 -> "123", le reste est du texte
+    valeurs = serie.to_numpy(dtype=object)
+    resultat = np.full(len(valeurs), "", dtype=object)
+    nuls = pd.isna(valeurs)
+    flottants = np.fromiter((isinstance(v, float) for v in valeurs), dtype=bool, count=len(valeurs)) & ~nuls
+    if flottants.any():
+        resultat[flottants] = _ids_flottants(valeurs[flottants].astype(float))
+    autres = ~nuls & ~flottants
+    resultat[autres] = pd.Series(valeurs[autres], dtype=object).astype(str).str.strip().tolist()
+    return pd.Series(resultat, index=serie.index)
+
+def colonne_texte(serie):
+    """Colonne convertie en texte, valeurs nulles remplacées par une chaîne vide"""
+    valeurs = serie.astype(object)
+    return valeurs.astype(str).where(valeurs.notna(), "").tolist()
+
+def _ids_table(table, col):
+    return table.ids(col) if isinstance(table, Feuille) else nettoyer_ids(table[col]).tolist()
+
+def preparer_enregistrements(table, colonnes, profilage=None):
+    """Passe vectorisée unique : NICAD nettoyés, nuls remplis, colonnes en texte.
+
+    `table` est un DataFrame (chargeur pandas) ou une Feuille (chargeur léger).
+    Retourne une liste de tuples (un par ligne) dans l'ordre de `colonnes`,
+    consommée directement par la boucle de rendu sans repasser par pandas.
+    Une colonne absente du classeur donne des chaînes vides. Avec `profilage`, le
+    nettoyage des NICAD est chronométré à part (sous-étape nettoyage_ids).
+    """
+    n = len(table)
+    colonnes_txt = []
+    for col in colonnes:
+        if col not in table.columns:
+            colonnes_txt.append([""] * n)
+        elif col == 'nicad':
+            colonnes_txt.append(chronometrer(profilage, 'nettoyage_ids', _ids_table, table, col))
+        elif isinstance(table, Feuille):
+            colonnes_txt.append(table.textes(col))
+        else:
+            colonnes_txt.append(colonne_texte(table[col]))
+    return list(zip(*colonnes_txt))
+
+# === CHARGEUR LÉGER (sans pandas) ===
+# Chaînes lues comme vides par pandas.read_excel (na_values par défaut)
+CHAINES_NA = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+    "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+CHAINES_VRAI = frozenset({"True", "TRUE", "true"})
+CHAINES_FAUX = frozenset({"False", "FALSE", "false"})
+RE_ENTIER = re.compile(r'\s*[+-]?\d+\s*$')
+RE_FLOTTANT = re.compile(r'\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*$|\s*[+-]?inf(inity)?\s*$', re.I)
+
+def _typer_colonne(valeurs):
+    """Types d'une colonne brute openpyxl, tels que pandas.read_excel les infère.
+
+    Texte numérique converti en nombre, colonne numérique avec des vides passée
+    en flottants, booléens purs conservés, sinon valeurs d'origine (colonne objet).
+    Les valeurs vides sont représentées par None.
+    """
+    brutes = []
+    for v in valeurs:
+        if v is None or (isinstance(v, str) and v in CHAINES_NA):
+            brutes.append(None)
+        elif isinstance(v, float) and v.is_integer():
+            brutes.append(int(v))
+        else:
+            brutes.append(v)
+    presentes = [v for v in brutes if v is not None]
+    if not presentes:
+        return brutes
+    a_vides = len(presentes) < len(brutes)
+
+    if not a_vides and all(isinstance(v, bool) or v in CHAINES_VRAI or v in CHAINES_FAUX for v in presentes):
+        return [v if isinstance(v, bool) else v in CHAINES_VRAI for v in brutes]
+
+    nombres = []
+    flottant = a_vides
+    for v in brutes:
+        if v is None:
+            nombres.append(None)
+        elif isinstance(v, (bool, int)):
+            nombres.append(int(v))
+        elif isinstance(v, float):
+            nombres.append(v)
+            flottant = True
+        elif isinstance(v, str) and RE_ENTIER.match(v):
+            nombres.append(int(v))
+        elif isinstance(v, str) and RE_FLOTTANT.match(v):
+            nombres.append(float(v))
+            flottant = True
+        else:
+            return brutes
+    if flottant:
+        return [None if n is None else float(n) for n in nombres]
+    return nombres
+
+def noms_colonnes(entetes):
+    """Noms de colonnes comme pandas : "Unnamed: i" et suffixes ".1" pour les doublons"""
+    columns, vus = [], {}
+    for i, nom in enumerate(entetes):
+        nom = f"Unnamed: {i}" if nom is None else nom
+        if nom in vus:
+            vus[nom] += 1
+            nom = f"{nom}.{vus[nom]}"
+        vus.setdefault(nom, 0)
+        columns.append(nom)
+    return columns
+
+def _flottant(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+class Feuille:
+    """Première feuille d'un classeur lue en flux (openpyxl, lecture seule) en colonnes Python.
+
+    Remplace le DataFrame dans le chargeur léger : mêmes noms de colonnes et mêmes
+    valeurs que pandas.read_excel, sans charger pandas ni numpy.
+    """
+
+    def __init__(self, columns, colonnes, nb_lignes):
+        self.columns = columns
+        self._colonnes = colonnes
+        self._nb_lignes = nb_lignes
+
+    @classmethod
+    def lire(cls, chemin):
+        from openpyxl import load_workbook
+
+        classeur = load_workbook(chemin, read_only=True, data_only=True, keep_links=False)
+        try:
+            lignes = classeur.worksheets[0].iter_rows(values_only=True)
+            entetes = list(next(lignes, ()))
+            brutes = [list(ligne) for ligne in lignes]
+        finally:
+            classeur.close()
+
+        while brutes and all(v is None for v in brutes[-1]):
+            brutes.pop()
+        largeur = max([len(entetes)] + [len(ligne) for ligne in brutes])
+        columns = noms_colonnes(entetes + [None] * (largeur - len(entetes)))
+
+        colonnes = {}
+        for i, nom in enumerate(columns):
+            colonnes[nom] = _typer_colonne([ligne[i] if i < len(ligne) else None for ligne in brutes])
+        return cls(columns, colonnes, len(brutes))
+
+    def __len__(self):
+        return self._nb_lignes
+
+    def ids(self, col):
+        """clean_id sur toute la colonne"""
+        return [clean_id(v) for v in self._colonnes[col]]
+
+    def textes(self, col):
+        """Colonne en texte, vides remplacés par une chaîne vide"""
+        return ["" if v is None else str(v) for v in self._colonnes[col]]
+
+def lire_classeur(chemin, chargeur=CHARGEUR):
+    """Première feuille d'un classeur : Feuille (chargeur léger) ou DataFrame (pandas)"""
+    if chargeur == "pandas":
+        import pandas as pd
+        return pd.read_excel(chemin)
+    return Feuille.lire(chemin)
+
 def nettoyer_connexions_donnees(doc):
     """Supprime les connexions de données et paramètres de publipostage"""
     try:
@@ -65,119 +364,402 @@ def optimiser_espacement(doc):
             para.paragraph_format.space_after = Pt(3)
         para.paragraph_format.line_spacing_rule = WD_LINE_SPACING.SINGLE
 
-def reduire_texte_legal(doc):
-    mots_cles = ['CERTIFIÉ CONFORME', 'APPROUVEE', 'SOUS-PREFET', 'LE MAIRE', 'FAIT LE',
-                 'arrêté préfectoral', 'délibération a été approuvée']
-    for para in doc.paragraphs:
-        if any(mot in para.text for mot in mots_cles):
+MOTS_CLES_LEGAUX = ('CERTIFIÉ CONFORME', 'APPROUVEE', 'SOUS-PREFET', 'LE MAIRE', 'FAIT LE',
+                    'arrêté préfectoral', 'délibération a été approuvée')
+
+def reduire_texte_legal(doc, indices=None):
+    paragraphes = doc.paragraphs
+    if indices is not None:
+        paragraphes = [paragraphes[i] for i in indices]
+    for para in paragraphes:
+        if any(mot in para.text for mot in MOTS_CLES_LEGAUX):
             for run in para.runs:
                 run.font.size = Pt(9)
                 run.font.name = 'Times New Roman'
 
-def remplacer_texte(doc, replacements):
-    for para in doc.paragraphs:
-        texte = para.text
-        keys_in_text = [k for k in replacements if k in texte]
-        
-        if not keys_in_text:
-            continue
-            
-        # Gestion Article 1
-        if "Article 1" in texte and para.runs:
-            texte_modifie = texte
-            for k, v in replacements.items():
-                if k in texte_modifie:
-                    val = str(v) if pd.notnull(v) else ""
-                    texte_modifie = texte_modifie.replace(k, val)
-            
-            for run in para.runs: run.text = ""
-            
-            parts = texte_modifie.split(":", 1)
-            if len(parts) > 1:
-                r1 = para.add_run(parts[0] + ":")
-                r1.font.name = 'Times New Roman'
-                r1.font.size = Pt(12)
-                r1.font.bold = True
-                r1.font.underline = True
-                
-                r2 = para.add_run(parts[1])
-                r2.font.name = 'Times New Roman'
-                r2.font.size = Pt(11)
-                r2.font.bold = True
-                r2.font.underline = False
+# === SUBSTITUTION DES CHAMPS ===
+RE_CHAMP = re.compile(r'«[^«»]+»')
+
+def _parties_texte(doc):
+    """Éléments racines des parties contenant du texte : corps, puis en-têtes et pieds de page"""
+    from docx.parts.hdrftr import FooterPart, HeaderPart
+
+    parties = [doc.part]
+    parties += [part for part in doc.part.package.iter_parts() if isinstance(part, (HeaderPart, FooterPart))]
+    return parties
+
+class Substitution:
+    """Remplacement des champs «...» en une seule passe, avec un matcher compilé une fois.
+
+    Les paragraphes à reconstruire sont repérés à la compilation dans chaque partie
+    (corps, en-têtes, pieds de page, tableaux imbriqués compris) avec leur règle de
+    mise en forme : "article" (Article 1), "corps" ou "tableau" (9 pt). Au rendu,
+    chaque partie n'est parcourue qu'une fois et le coût ne dépend plus du nombre de champs.
+    """
+
+    def __init__(self, elements, cles):
+        cles = sorted(cles, key=len, reverse=True)
+        self._matcher = re.compile('(' + '|'.join(map(re.escape, cles)) + ')') if cles else None
+        self.cibles = []
+        if self._matcher is None:
+            return
+        tc = qn('w:tc')
+        for i_partie, element in enumerate(elements):
+            for i_para, p in enumerate(element.iter(qn('w:p'))):
+                texte = Paragraph(p, None).text
+                if not self._matcher.search(texte):
+                    continue
+                if any(ancetre.tag == tc for ancetre in p.iterancestors()):
+                    regle = "tableau"
+                elif "Article 1" in texte and p.r_lst:
+                    regle = "article"
+                else:
+                    regle = "corps"
+                self.cibles.append((i_partie, i_para, regle))
+
+    def appliquer(self, elements, replacements):
+        """Remplit les paragraphes repérés dans `elements` (même structure qu'à la compilation)"""
+        paragraphes = {}
+        for i_partie, i_para, regle in self.cibles:
+            if i_partie not in paragraphes:
+                paragraphes[i_partie] = list(elements[i_partie].iter(qn('w:p')))
+            para = Paragraph(paragraphes[i_partie][i_para], None)
+            if regle == "article":
+                self._remplir_article(para, replacements)
             else:
-                para.add_run(texte_modifie)
-            continue
+                self._remplir(para, replacements, Pt(9) if regle == "tableau" else None)
+
+    def _remplir_article(self, para, replacements):
+        texte_modifie = self._matcher.sub(lambda m: replacements.get(m.group(), m.group()), para.text)
+
+        for run in para.runs: run.text = ""
+
+        parts = texte_modifie.split(":", 1)
+        if len(parts) > 1:
+            r1 = para.add_run(parts[0] + ":")
+            r1.font.name = 'Times New Roman'
+            r1.font.size = Pt(12)
+            r1.font.bold = True
+            r1.font.underline = True
+
+            r2 = para.add_run(parts[1])
+            r2.font.name = 'Times New Roman'
+            r2.font.size = Pt(11)
+            r2.font.bold = True
+            r2.font.underline = False
+        else:
+            para.add_run(texte_modifie)
+
+    def _remplir(self, para, replacements, taille):
+        # Valeurs en gras, texte fixe en maigre, le tout en Times New Roman
+        segments = self._matcher.split(para.text)
 
-        # Gestion générale avec mise en gras
-        keys_sorted = sorted(keys_in_text, key=len, reverse=True)
-        pattern = '|'.join(map(re.escape, keys_sorted))
-        segments = re.split(f'({pattern})', texte)
-        
         for run in para.runs:
             run.text = ""
-        
+
         for seg in segments:
-            if seg in replacements:
-                val = replacements[seg]
-                val_str = str(val) if pd.notnull(val) else ""
-                run = para.add_run(val_str)
-                run.font.bold = True
-                run.font.name = 'Times New Roman'
-            else:
-                run = para.add_run(seg)
-                run.font.bold = False
-                run.font.name = 'Times New Roman'
-    
-    # Traitement des tableaux
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    txt = para.text
-                    keys = [k for k in replacements if k in txt]
-                    if keys:
-                        keys_sorted = sorted(keys, key=len, reverse=True)
-                        pattern = '|'.join(map(re.escape, keys_sorted))
-                        segs = re.split(f'({pattern})', txt)
-                        for run in para.runs: run.text = ""
-                        for seg in segs:
-                            if seg in replacements:
-                                val = str(replacements[seg]) if pd.notnull(replacements[seg]) else ""
-                                r = para.add_run(val)
-                                r.font.bold = True
-                                r.font.name = 'Times New Roman'
-                                r.font.size = Pt(9)
-                            else:
-                                r = para.add_run(seg)
-                                r.font.bold = False
-                                r.font.name = 'Times New Roman'
-                                r.font.size = Pt(9)
-
-def obtenir_points(nicad, df_coords):
-    points_df = df_coords[df_coords['nicad'] == nicad].copy()
-    if points_df.empty:
-        return []
-    if 'vertex_index' in points_df.columns:
-        points_df = points_df.sort_values('vertex_index')
-    
-    col_x = 'X' if 'X' in points_df.columns else 'x_centroid'
-    col_y = 'Y' if 'Y' in points_df.columns else 'y_centroid'
-    
-    liste_points = []
-    for idx, (_, row) in enumerate(points_df.iterrows(), start=1):
-        x_val = row[col_x]
-        y_val = row[col_y]
-        x_fmt = f"{float(x_val):.2f}" if pd.notnull(x_val) else ""
-        y_fmt = f"{float(y_val):.2f}" if pd.notnull(y_val) else ""
-        liste_points.append((f"P{idx}", x_fmt, y_fmt))
-    return liste_points
-
-def parser_beneficiaires(row):
-    prenoms = str(row.get('Prenom', '')).split('\n') if pd.notnull(row.get('Prenom')) else []
-    noms = str(row.get('Nom', '')).split('\n') if pd.notnull(row.get('Nom')) else []
-    col_piece = 'Numero_piece' if 'Numero_piece' in row.index else 'Num_piece'
-    pieces = str(row.get(col_piece, '')).split('\n') if pd.notnull(row.get(col_piece)) else []
+            val = replacements.get(seg)
+            run = para.add_run(seg if val is None else val)
+            run.font.bold = val is not None
+            run.font.name = 'Times New Roman'
+            if taille is not None:
+                run.font.size = taille
+
+# === MODÈLES COMPILÉS ===
+class ModeleCompile:
+    """Modèle .docx chargé et normalisé une seule fois, puis cloné pour chaque parcelle.
+
+    Les passes indépendantes de la ligne (connexions de données, marges, espacement,
+    texte légal) sont appliquées au chargement. Seuls les arbres XML du corps et des
+    en-têtes / pieds de page contenant des champs sont copiés à chaque instanciation,
+    le reste du paquet (styles, numérotation, médias) est partagé.
+    """
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._doc = Document(chemin)
+        nettoyer_connexions_donnees(self._doc)
+        optimiser_mise_en_page(self._doc)
+        optimiser_espacement(self._doc)
+        reduire_texte_legal(self._doc)
+
+        # Repérage des champs «...» dans chaque partie ; le corps est toujours cloné
+        self.champs = set()
+        self._parties = []
+        self._paquet = None
+        for part in _parties_texte(self._doc):
+            trouves = set()
+            for p in part.element.iter(qn('w:p')):
+                trouves.update(RE_CHAMP.findall(Paragraph(p, None).text))
+            if trouves or part is self._doc.part:
+                self.champs.update(trouves)
+                self._parties.append((part, part.element))
+
+        # Paragraphes du corps reconstruits par la substitution (texte légal ré-appliqué)
+        self.paragraphes_champs = [i for i, para in enumerate(self._doc.paragraphs) if RE_CHAMP.search(para.text)]
+        self._substitutions = {}
+        self._gabarits = {}
+
+    def instancier(self):
+        """Document neuf sur une copie des parties préparées.
+
+        Le document retourné partage le paquet du modèle : il reste valable
+        jusqu'au prochain appel à instancier().
+        """
+        for part, element in self._parties:
+            part._element = copy.deepcopy(element)
+        return self._doc.part.document
+
+    def paquet(self):
+        """Paquet .docx du modèle préparé, champs vidés (en-têtes et pieds de page compris).
+
+        Sert de base au document fusionné. Calculé une fois : le premier appel invalide
+        le document de la dernière instanciation, il doit donc précéder le rendu.
+        """
+        if self._paquet is None:
+            doc = self.instancier()
+            self.remplir({champ: "" for champ in self.champs})
+            flux = io.BytesIO()
+            doc.save(flux)
+            self._paquet = flux.getvalue()
+        return self._paquet
+
+    def gabarit_xml(self, cles, tableaux):
+        """GabaritDocx du modèle pour ces champs et ces tableaux, construit au premier appel.
+
+        La construction instancie le modèle : comme paquet(), elle doit précéder le rendu.
+        """
+        cle = (tuple(cles), tuple(tableaux))
+        if cle not in self._gabarits:
+            self._gabarits[cle] = GabaritDocx(self, cles, tableaux)
+        return self._gabarits[cle]
+
+    def gabarit_corps(self):
+        """document.xml du modèle coupé en (début, fin) autour du contenu du corps"""
+        from lxml import etree
+
+        racine = copy.deepcopy(self._parties[0][1])
+        body = racine.find(qn('w:body'))
+        for enfant in list(body):
+            if enfant.tag != qn('w:sectPr'):
+                body.remove(enfant)
+        body.insert(0, etree.Comment("CORPS"))
+        texte = etree.tostring(racine, encoding='UTF-8', standalone=True)
+        debut, fin = texte.split(b"<!--CORPS-->")
+        return debut, fin
+
+    def remplir(self, replacements):
+        """Substitution des champs sur l'instance courante ; matcher compilé une fois par jeu de clés"""
+        cles = frozenset(replacements)
+        substitution = self._substitutions.get(cles)
+        if substitution is None:
+            substitution = Substitution([element for _, element in self._parties], cles & self.champs)
+            self._substitutions[cles] = substitution
+        substitution.appliquer([part.element for part, _ in self._parties], replacements)
+
+# === INDEX DES COORDONNÉES ===
+class IndexCoordonnees:
+    """Index NICAD → sommets, construit une seule fois au chargement des coordonnées.
+
+    Les sommets sont triés par vertex_index et stockés en array('d') (formatés en
+    %.2f à la demande) ; chaque NICAD pointe sur une tranche [debut, fin) des
+    colonnes X/Y, d'où une recherche en O(1).
+    """
+
+    def __init__(self, tranches=None, x=(), y=(), colonnes=()):
+        self._tranches = tranches or {}
+        # En-têtes de la feuille source, gardés pour le contrôle préalable sans relire le classeur
+        self.colonnes = list(colonnes)
+        self._x = x if isinstance(x, array) else array('d', x)
+        self._y = y if isinstance(y, array) else array('d', y)
+        self.nb_sommets = len(self._x)
+        taille_max = max((fin - debut for debut, fin in self._tranches.values()), default=0)
+        self._etiquettes = [f"P{i}" for i in range(1, taille_max + 1)]
+
+    @staticmethod
+    def _colonnes_xy(columns):
+        col_x = 'X' if 'X' in columns else 'x_centroid'
+        col_y = 'Y' if 'Y' in columns else 'y_centroid'
+        return col_x, col_y
+
+    @classmethod
+    def colonnes_requises(cls, columns):
+        """Colonnes sans lesquelles aucun sommet ne peut être indexé"""
+        return ['nicad', *cls._colonnes_xy(columns)]
+
+    @classmethod
+    def _sans_colonnes_requises(cls, columns, source):
+        """Index vide (en-têtes conservés) si une colonne requise manque, pour que le
+        contrôle préalable la signale au lieu d'un échec au chargement"""
+        absentes = [col for col in cls.colonnes_requises(columns) if col not in columns]
+        if not absentes:
+            return None
+        log(f"   ⚠️ {source} : colonne(s) {', '.join(absentes)} absente(s), aucun sommet indexé")
+        return cls(colonnes=columns)
+
+    @classmethod
+    def _depuis_colonnes(cls, nicads, xs, ys, ordres=None, colonnes=()):
+        """Regroupe les sommets par NICAD (ordre des NICAD trié), triés par vertex_index dans chaque groupe"""
+        groupes = {}
+        for i, nicad in enumerate(nicads):
+            groupes.setdefault(nicad, []).append(i)
+
+        tranches = {}
+        ordre = array('l')
+        for nicad in sorted(groupes):
+            lignes = groupes.pop(nicad)
+            if ordres is not None:
+                lignes.sort(key=lambda i: (math.isnan(ordres[i]), 0.0 if math.isnan(ordres[i]) else ordres[i]))
+            tranches[nicad] = (len(ordre), len(ordre) + len(lignes))
+            ordre.extend(lignes)
+        return cls(tranches, (xs[i] for i in ordre), (ys[i] for i in ordre), colonnes)
+
+    @classmethod
+    def lire(cls, chemin, taille_bloc=TAILLE_BLOC_COORDS, profilage=None):
+        """Index lu en flux depuis un classeur COORDS, sans matérialiser la feuille.
+
+        Seules les colonnes utilisées sont lues, par blocs de `taille_bloc` lignes,
+        directement en array('d'). Les NICAD sont codés par leur valeur brute (une
+        entrée par parcelle, pas par sommet) puis nettoyés une fois à la fin, avec
+        le même typage de colonne que le chargeur léger.
+        """
+        from openpyxl import load_workbook
+
+        codes, bruts = array('l'), {}
+        xs, ys, ordres = array('d'), array('d'), array('d')
+        classeur = load_workbook(chemin, read_only=True, data_only=True, keep_links=False)
+        try:
+            lignes = classeur.worksheets[0].iter_rows(values_only=True)
+            columns = noms_colonnes(list(next(lignes, ())))
+            if not columns:
+                return cls()
+            vide = cls._sans_colonnes_requises(columns, os.path.basename(chemin))
+            if vide is not None:
+                return vide
+            col_x, col_y = cls._colonnes_xy(columns)
+            i_nicad, i_x, i_y = columns.index('nicad'), columns.index(col_x), columns.index(col_y)
+            i_ordre = columns.index('vertex_index') if 'vertex_index' in columns else None
+            positions = [i for i in (i_nicad, i_x, i_y, i_ordre) if i is not None]
+            largeur = max(positions) + 1
+
+            # Les lignes entièrement vides ne comptent que suivies de données, comme pour pandas
+            vides_en_attente = 0
+            for bloc in iter(lambda: list(islice(lignes, taille_bloc)), []):
+                bloc_codes, bloc_x, bloc_y, bloc_ordres = [], [], [], []
+                for ligne in bloc:
+                    if all(v is None for v in ligne):
+                        vides_en_attente += 1
+                        continue
+                    if vides_en_attente:
+                        bloc_codes.extend([bruts.setdefault(None, len(bruts))] * vides_en_attente)
+                        bloc_x.extend([math.nan] * vides_en_attente)
+                        bloc_y.extend([math.nan] * vides_en_attente)
+                        bloc_ordres.extend([math.nan] * vides_en_attente)
+                        vides_en_attente = 0
+                    if len(ligne) < largeur:
+                        ligne = tuple(ligne) + (None,) * (largeur - len(ligne))
+                    bloc_codes.append(bruts.setdefault(ligne[i_nicad], len(bruts)))
+                    bloc_x.append(_flottant(ligne[i_x]))
+                    bloc_y.append(_flottant(ligne[i_y]))
+                    bloc_ordres.append(math.nan if i_ordre is None else _flottant(ligne[i_ordre]))
+                codes.extend(bloc_codes)
+                xs.extend(bloc_x)
+                ys.extend(bloc_y)
+                ordres.extend(bloc_ordres)
+        finally:
+            classeur.close()
+
+        # Typage et nettoyage des NICAD distincts uniquement, puis chaînes partagées par tous leurs sommets
+        debut = time.perf_counter()
+        cles = [sys.intern(clean_id(v)) for v in _typer_colonne(list(bruts))]
+        if profilage is not None:
+            profilage.cumuler('nettoyage_ids', time.perf_counter() - debut)
+        return cls._depuis_colonnes([cles[code] for code in codes], xs, ys, ordres if i_ordre is not None else None,
+                                    columns)
+
+    @staticmethod
+    def _formater(valeur):
+        return "" if math.isnan(valeur) else "%.2f" % valeur
+
+    def etat(self):
+        """(tranches, x, y, colonnes) en types natifs : de quoi reconstruire l'index (cache, pickle)"""
+        return self._tranches, self._x, self._y, self.colonnes
+
+    def __contains__(self, nicad):
+        return nicad in self._tranches
+
+    def __len__(self):
+        return len(self._tranches)
+
+    def nicads(self):
+        return self._tranches.keys()
+
+    def mesures(self):
+        """Mesures géométriques de toutes les parcelles en une passe numpy.
+
+        Retourne (nicads, colonnes) : tableaux alignés sur `nicads` pour l'aire
+        (formule du lacet), le périmètre, le nombre de sommets, les sommets
+        répétés, les coordonnées manquantes et la fermeture explicite (dernier
+        sommet = premier). Les tranches partitionnent les colonnes X/Y dans l'ordre.
+        """
+        import numpy as np
+
+        nicads = list(self._tranches)
+        if not nicads:
+            return nicads, None
+        bornes = np.array(list(self._tranches.values()), dtype=np.int64).reshape(-1, 2)
+        debuts, fins = bornes[:, 0], bornes[:, 1]
+        longueurs = fins - debuts
+        x = np.frombuffer(self._x, dtype=np.float64)
+        y = np.frombuffer(self._y, dtype=np.float64)
+        groupes = np.repeat(np.arange(len(nicads)), longueurs)
+
+        # Relatif au premier sommet : pas de perte de précision sur les produits de coordonnées UTM
+        xr = x - np.repeat(x[debuts], longueurs)
+        yr = y - np.repeat(y[debuts], longueurs)
+        suivants = np.arange(1, len(x) + 1)
+        suivants[fins - 1] = debuts
+        aires = np.abs(np.add.reduceat(xr * yr[suivants] - xr[suivants] * yr, debuts)) / 2
+        perimetres = np.add.reduceat(np.hypot(xr[suivants] - xr, yr[suivants] - yr), debuts)
+        manquants = np.add.reduceat((np.isnan(x) | np.isnan(y)).astype(np.int64), debuts)
+        fermes = (longueurs > 2) & (x[debuts] == x[fins - 1]) & (y[debuts] == y[fins - 1])
+
+        # Sommets répétés : tri par parcelle puis coordonnées, voisins identiques (hors fermeture)
+        tri = np.lexsort((y, x, groupes))
+        g, xt, yt = groupes[tri], x[tri], y[tri]
+        identiques = (g[1:] == g[:-1]) & (xt[1:] == xt[:-1]) & (yt[1:] == yt[:-1])
+        doublons = np.bincount(g[1:][identiques], minlength=len(nicads)) - fermes
+
+        return nicads, {
+            'aire': aires,
+            'perimetre': perimetres,
+            'sommets': longueurs - fermes,
+            'doublons': doublons,
+            'manquants': manquants,
+            'ferme': fermes,
+        }
+
+    def nb_points(self, nicad):
+        debut, fin = self._tranches.get(nicad, (0, 0))
+        return fin - debut
+
+    def points(self, nicad):
+        tranche = self._tranches.get(nicad)
+        if tranche is None:
+            return []
+        debut, fin = tranche
+        formater = self._formater
+        return [(etiquette, formater(x), formater(y))
+                for etiquette, x, y in zip(self._etiquettes, self._x[debut:fin], self._y[debut:fin])]
+
+def obtenir_points(nicad, index_coords):
+    return index_coords.points(nicad)
+
+def parser_beneficiaires(prenoms, noms, pieces):
+    """Découpe les cellules multi-lignes Prenom / Nom / pièce en bénéficiaires"""
+    prenoms = prenoms.split('\n') if prenoms else []
+    noms = noms.split('\n') if noms else []
+    pieces = pieces.split('\n') if pieces else []
     
     max_len = max(len(prenoms), len(noms), len(pieces), 1)
     prenoms = prenoms + [''] * (max_len - len(prenoms))
@@ -193,6 +775,76 @@ def parser_beneficiaires(row):
             beneficiaires.append((prenom, nom, cni))
     return beneficiaires
 
+def _lignes_cellule(cellule):
+    return cellule.count('\n') + 1 if cellule else 0
+
+class IndexBeneficiaires:
+    """Bénéficiaires de toutes les parcelles collectives, développés une fois au chargement.
+
+    Les cellules multi-lignes Prenom / Nom / pièce de la feuille COLL sont éclatées
+    en une table longue (prénoms, noms, pièces alignés par rang), et chaque NICAD
+    y pointe sur sa tranche : le rendu n'a plus qu'une recherche à faire. Les
+    parcelles dont les trois cellules n'ont pas le même nombre de lignes sont
+    relevées en bloc (`incoherents`) ; les lignes manquantes restent complétées
+    par des vides, comme parser_beneficiaires.
+    """
+
+    def __init__(self, tranches=None, colonnes=([], [], []), incoherents=(), sans_beneficiaire=()):
+        # nicad -> (cellules d'origine, début, fin) dans les colonnes de la table longue
+        self._tranches = tranches or {}
+        self._prenoms, self._noms, self._pieces = colonnes
+        self.incoherents = list(incoherents)
+        self.sans_beneficiaire = list(sans_beneficiaire)
+
+    @classmethod
+    def depuis_enregistrements(cls, enregs):
+        """Index des enregistrements PC, en une passe sur la feuille"""
+        debut = 1 + len(CHAMPS_COLL)
+        cellules = [enreg[debut:debut + 3] for enreg in enregs]
+        if not cellules:
+            return cls()
+        colonnes, bornes, comptes = cls._developper(cellules)
+
+        tranches = {}
+        incoherents, sans_beneficiaire = [], []
+        for enreg, cellules_enreg, (debut, fin), (prenoms, noms, pieces) in zip(enregs, cellules, bornes, comptes):
+            nicad = enreg[0]
+            # NICAD en double : la première ligne est indexée, les suivantes repassent par parser_beneficiaires
+            tranches.setdefault(nicad, (cellules_enreg, debut, fin))
+            if not (prenoms or noms or pieces):
+                sans_beneficiaire.append(nicad)
+            elif not prenoms == noms == pieces:
+                incoherents.append({'nicad': nicad, 'prenoms': prenoms, 'noms': noms, 'pieces': pieces})
+        return cls(tranches, colonnes, incoherents, sans_beneficiaire)
+
+    @staticmethod
+    def _developper(cellules):
+        colonnes = ([], [], [])
+        bornes, comptes = [], []
+        for cellules_enreg in cellules:
+            debut = len(colonnes[0])
+            for colonne, valeurs in zip(colonnes, zip(*parser_beneficiaires(*cellules_enreg))):
+                colonne.extend(valeurs)
+            bornes.append((debut, len(colonnes[0])))
+            comptes.append([_lignes_cellule(v) for v in cellules_enreg])
+        return colonnes, bornes, comptes
+
+    def __len__(self):
+        return len(self._tranches)
+
+    @property
+    def nb_beneficiaires(self):
+        return len(self._prenoms)
+
+    def obtenir(self, nicad, cellules):
+        """Bénéficiaires [(prénom, nom, pièce)] de la parcelle ; `cellules` (Prenom, Nom,
+        pièce) vérifie que la tranche indexée est bien celle de cet enregistrement"""
+        tranche = self._tranches.get(nicad)
+        if tranche is None or tranche[0] != tuple(cellules):
+            return parser_beneficiaires(*cellules)
+        _, debut, fin = tranche
+        return list(zip(self._prenoms[debut:fin], self._noms[debut:fin], self._pieces[debut:fin]))
+
 def set_cell_text(cell, text, font_size=10, bold=False, center=False):
     cell.text = ""
     if cell.paragraphs:
@@ -207,33 +859,85 @@ def set_cell_text(cell, text, font_size=10, bold=False, center=False):
         from docx.enum.text import WD_ALIGN_PARAGRAPH
         p.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
+BORDURES_TABLEAU = ('top', 'left', 'bottom', 'right', 'insideH', 'insideV')
+# Éléments de w:tblPr qui suivent w:tblBorders dans le schéma
+SUIVANTS_TBL_BORDERS = tuple(qn(f'w:{nom}') for nom in (
+    'shd', 'tblLayout', 'tblCellMar', 'tblLook', 'tblCaption', 'tblDescription', 'tblPrChange'))
+
 def set_table_borders(table):
+    """Bordures simples sur tout le tableau ; remplace les bordures existantes au lieu d'en empiler"""
     from docx.oxml import OxmlElement
-    from docx.oxml.ns import qn
     tbl = table._tbl
     tblPr = tbl.tblPr if tbl.tblPr is not None else OxmlElement('w:tblPr')
+    for ancien in tblPr.findall(qn('w:tblBorders')):
+        tblPr.remove(ancien)
     tblBorders = OxmlElement('w:tblBorders')
-    for border_name in ['top', 'left', 'bottom', 'right', 'insideH', 'insideV']:
+    for border_name in BORDURES_TABLEAU:
         border = OxmlElement(f'w:{border_name}')
         border.set(qn('w:val'), 'single')
         border.set(qn('w:sz'), '4')
         border.set(qn('w:space'), '0')
         border.set(qn('w:color'), '000000')
         tblBorders.append(border)
-    tblPr.append(tblBorders)
+    suivant = next((enfant for enfant in tblPr if enfant.tag in SUIVANTS_TBL_BORDERS), None)
+    if suivant is not None:
+        suivant.addprevious(tblBorders)
+    else:
+        tblPr.append(tblBorders)
     if tbl.tblPr is None:
         tbl.insert(0, tblPr)
 
-def remplir_tableau_coordonnees(doc, table_index, points):
-    import math
-    if not points or table_index >= len(doc.tables):
-        return
-    
-    table = doc.tables[table_index]
-    while len(table.rows) > 0:
-        row = table.rows[-1]
-        table._tbl.remove(row._tr)
-    
+# === TABLEAUX ===
+class PrototypeLigne:
+    """Ligne de tableau mise en forme une seule fois (add_row + set_cell_text), puis clonée.
+
+    `cellules` donne (taille, gras, centré) des premières colonnes ; chaque clone ne
+    fait que réécrire le texte de leur run, les autres colonnes restant vides comme
+    après table.add_row(). Une ligne passée à `ligne` peut contenir None : la cellule
+    est alors laissée vide. Les prototypes dépendent des largeurs de la grille et sont
+    mis en cache par disposition.
+    """
+    _cache = {}
+
+    @classmethod
+    def pour(cls, table, cellules):
+        cle = (tuple(col.w for col in table._tbl.tblGrid.gridCol_lst), cellules)
+        prototype = cls._cache.get(cle)
+        if prototype is None:
+            prototype = cls._cache[cle] = cls(table, cellules)
+        return prototype
+
+    def __init__(self, table, cellules):
+        ligne = table.add_row()
+        self._vides = [copy.deepcopy(tc) for tc in ligne._tr.tc_lst]
+        for i, (taille, gras, centre) in enumerate(cellules):
+            set_cell_text(ligne.cells[i], "", taille, gras, centre)
+        self._tr = ligne._tr
+        table._tbl.remove(self._tr)
+        runs = list(self._tr.iter(qn('w:r')))
+        self._runs = [runs.index(tc.findall('.//' + qn('w:r'))[-1]) for tc in self._tr.tc_lst[:len(cellules)]]
+
+    def ligne(self, textes):
+        tr = copy.deepcopy(self._tr)
+        runs = list(tr.iter(qn('w:r')))
+        for i, texte in enumerate(textes):
+            if texte is None:
+                tc = tr.tc_lst[i]
+                tr.replace(tc, copy.deepcopy(self._vides[i]))
+            else:
+                runs[self._runs[i]].text = str(texte)
+        return tr
+
+def vider_tableau(table, lignes_conservees=0):
+    tbl = table._tbl
+    for tr in tbl.tr_lst[lignes_conservees:]:
+        tbl.remove(tr)
+
+ENTETE_COORDONNEES = ("PT", "X", "Y")
+
+def disposition_coordonnees(points):
+    """(nb_blocs, lignes) du tableau des coordonnées : 1 à 3 blocs PT/X/Y côte à côte,
+    remplis colonne par colonne ; None pour les cases vides du dernier bloc"""
     nb_points = len(points)
     if nb_points <= 15:
         nb_blocs = 1
@@ -241,157 +945,2158 @@ def remplir_tableau_coordonnees(doc, table_index, points):
         nb_blocs = 2
     else:
         nb_blocs = 3
-    
     cols_per_bloc = 3
-    total_cols = nb_blocs * cols_per_bloc
-    
-    while len(table.columns) < total_cols:
-        table.add_column(width=Cm(1.5))
-    
-    header_row = table.add_row()
-    for i in range(nb_blocs):
-        base_idx = i * cols_per_bloc
-        if base_idx < len(header_row.cells):
-            set_cell_text(header_row.cells[base_idx], "PT", 8, True, True)
-            set_cell_text(header_row.cells[base_idx+1], "X", 8, True, True)
-            set_cell_text(header_row.cells[base_idx+2], "Y", 8, True, True)
-    
     rows_needed = math.ceil(nb_points / nb_blocs)
-    
+
+    lignes = []
     for r in range(rows_needed):
-        row = table.add_row()
+        textes = []
         for b in range(nb_blocs):
             point_idx = r + (b * rows_needed)
-            if point_idx < nb_points:
-                pt_data = points[point_idx]
-                base_col = b * cols_per_bloc
-                if base_col + 2 < len(row.cells):
-                    set_cell_text(row.cells[base_col], pt_data[0], 7.5, True, True)
-                    set_cell_text(row.cells[base_col+1], pt_data[1], 7.5, True, True)
-                    set_cell_text(row.cells[base_col+2], pt_data[2], 7.5, True, True)
+            textes.extend(points[point_idx] if point_idx < nb_points else (None,) * cols_per_bloc)
+        lignes.append(textes)
+    return nb_blocs, lignes
+
+def remplir_tableau_coordonnees(doc, table_index, points):
+    if not points or table_index >= len(doc.tables):
+        return
+    
+    table = doc.tables[table_index]
+    vider_tableau(table)
+    
+    nb_blocs, textes = disposition_coordonnees(points)
+    total_cols = nb_blocs * 3
+    
+    while len(table.columns) < total_cols:
+        table.add_column(width=Cm(1.5))
+    
+    # Une ligne prototype par disposition (1, 2 ou 3 blocs), toutes les lignes ajoutées d'un coup
+    entete = PrototypeLigne.pour(table, ((8, True, True),) * total_cols)
+    donnees = PrototypeLigne.pour(table, ((7.5, True, True),) * total_cols)
+    lignes = [entete.ligne(ENTETE_COORDONNEES * nb_blocs)]
+    lignes.extend(donnees.ligne(ligne) for ligne in textes)
+    table._tbl.extend(lignes)
     
     set_table_borders(table)
     table.alignment = WD_TABLE_ALIGNMENT.CENTER
 
 def remplir_tableau_beneficiaires(table, beneficiaires):
-    while len(table.rows) > 1:
-        row = table.rows[-1]
-        table._tbl.remove(row._tr)
-    for prenom, nom, cni in beneficiaires:
-        row = table.add_row()
-        set_cell_text(row.cells[0], prenom, 9, bold=True)
-        set_cell_text(row.cells[1], nom, 9, bold=True)
-        set_cell_text(row.cells[2], cni, 9, bold=True)
+    vider_tableau(table, 1)
+    prototype = PrototypeLigne.pour(table, ((9, True, False),) * 3)
+    table._tbl.extend([prototype.ligne(beneficiaire) for beneficiaire in beneficiaires])
     set_table_borders(table)
 
-# === MAIN ===
-def main():
-    log("[PYTHON] Démarrage du Python Engine...")
+# === RENDU XML DIRECT ===
+# Emplacements repérés dans le XML sérialisé : caractères à usage privé, absents des modèles
+SENTINELLE = "\ue000{}\ue001"
+RE_SENTINELLE = re.compile(rb'(<w:t>)?\xee\x80\x80(\d+)\xee\x80\x81(</w:t>)?')
+# Colonnes des lignes de tableau : numéros d'emplacement distincts de ceux des champs
+CELLULE = 10000
+RE_LIGNE = re.compile(rb'<w:tr[ >].*?</w:tr>', re.S)
+RE_CELLULE = re.compile(rb'<w:tc[ >].*?</w:tc>', re.S)
+# Caractères refusés par lxml : le rendu python-docx signale l'erreur
+RE_HORS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+RE_SEPARATEURS_RUN = re.compile('[\t\r\n]')
+
+def _t_xml(texte):
+    if not texte:
+        return b""
+    espace = ' xml:space="preserve"' if len(texte.strip()) < len(texte) else ""
+    return f'<w:t{espace}>{escape(texte)}</w:t>'.encode('utf-8')
+
+def texte_run_xml(texte):
+    """Contenu d'un run pour `texte`, à l'octet près comme run.text de python-docx
+    (tabulations en w:tab, retours à la ligne en w:br, xml:space si espaces aux bords)"""
+    morceaux = []
+    debut = 0
+    for separateur in RE_SEPARATEURS_RUN.finditer(texte):
+        morceaux.append(_t_xml(texte[debut:separateur.start()]))
+        morceaux.append(b'<w:tab/>' if separateur.group() == '\t' else b'<w:br/>')
+        debut = separateur.end()
+    morceaux.append(_t_xml(texte[debut:]))
+    return b"".join(morceaux)
+
+class GabaritOctets:
+    """XML sérialisé coupé aux sentinelles : littéraux et emplacements numérotés.
+
+    Un emplacement "run" occupe tout un <w:t> (valeur écrite comme run.text) ;
+    un emplacement "en ligne" est pris dans un texte plus long (valeur échappée seule).
+    """
+
+    def __init__(self, octets):
+        self.litteraux = []
+        self.emplacements = []
+        courant = b""
+        position = 0
+        for trouve in RE_SENTINELLE.finditer(octets):
+            ouvrant, numero, fermant = trouve.groups()
+            en_run = ouvrant is not None and fermant is not None
+            courant += octets[position:trouve.start()] + (b"" if en_run else ouvrant or b"")
+            self.litteraux.append(courant)
+            self.emplacements.append((int(numero), en_run))
+            courant = b"" if en_run else fermant or b""
+            position = trouve.end()
+        self.litteraux.append(courant + octets[position:])
+
+    def numeros(self, en_run=None):
+        return {numero for numero, run in self.emplacements if en_run is None or run == en_run}
+
+    def rendre(self, valeurs):
+        morceaux = [self.litteraux[0]]
+        for (numero, en_run), litteral in zip(self.emplacements, self.litteraux[1:]):
+            valeur = valeurs[numero]
+            morceaux.append(texte_run_xml(valeur) if en_run else escape(valeur).encode('utf-8'))
+            morceaux.append(litteral)
+        return b"".join(morceaux)
+
+class GabaritTableau:
+    """Tableau rempli découpé : début (propriétés, grille, ligne d'en-tête), gabarit de
+    chaque cellule de ligne de données (texte ou vide), fin"""
+
+    def __init__(self, octets):
+        lignes = list(RE_LIGNE.finditer(octets))
+        self.debut = GabaritOctets(octets[:lignes[0].end()])
+        self.fin = GabaritOctets(octets[lignes[-1].end():])
+        premiere = lignes[1].group()
+        cellules = list(RE_CELLULE.finditer(premiere))
+        self.debut_ligne = premiere[:cellules[0].start()]
+        self.fin_ligne = premiere[cellules[-1].end():]
+        self.cellules = [GabaritOctets(cellule.group()) for cellule in cellules]
+        # Cellules vides (None) : prises dans la dernière ligne, la seule à en avoir
+        self.vides = [None] * len(cellules)
+        for i, cellule in enumerate(RE_CELLULE.finditer(lignes[-1].group())):
+            if not RE_SENTINELLE.search(cellule.group()):
+                self.vides[i] = cellule.group()
+
+    def rendre(self, champs, lignes):
+        morceaux = [self.debut.rendre(champs)]
+        for textes in lignes:
+            morceaux.append(self.debut_ligne)
+            for i, cellule in enumerate(self.cellules):
+                # Colonnes de la grille au-delà des textes : cellules laissées telles quelles
+                if i >= len(textes):
+                    morceaux.append(cellule.litteraux[0])
+                elif textes[i] is None:
+                    morceaux.append(self.vides[i])
+                else:
+                    morceaux.append(cellule.rendre({CELLULE + i: str(textes[i])}))
+            morceaux.append(self.fin_ligne)
+        morceaux.append(self.fin.rendre(champs))
+        return b"".join(morceaux)
+
+def _heure_dos(instant):
+    return ((instant.tm_year - 1980) << 9 | instant.tm_mon << 5 | instant.tm_mday,
+            instant.tm_hour << 11 | instant.tm_min << 5 | instant.tm_sec // 2)
+
+class GabaritDocx:
+    """Modèle compilé pour le rendu XML direct, sans objets python-docx par extrait.
+
+    Le modèle est rendu une fois par python-docx avec des sentinelles à la place des
+    valeurs (champs, cellules des tableaux remplis) ; le XML obtenu est coupé en
+    littéraux et emplacements, et chaque tableau rempli l'est dans chacune de ses
+    dispositions. Un extrait est alors une concaténation d'octets échappés, écrite
+    dans un zip dont les parties sans champs sont recopiées déjà compressées.
+
+    `tableaux` donne le rôle des premiers tableaux du corps ("beneficiaires",
+    "coordonnees"). Les rares valeurs qui changeraient la structure produite par
+    python-docx (":" dans l'Article 1, mots-clés du texte légal, caractères hors XML)
+    font retourner None : l'extrait est alors rendu par python-docx.
+    """
+
+    def __init__(self, modele, cles, tableaux):
+        from lxml import etree
+
+        self.cles = list(cles)
+        sentinelles = {cle: SENTINELLE.format(i) for i, cle in enumerate(self.cles)}
+        self.tableaux = []
+
+        def instance(remplir=None):
+            doc = modele.instancier()
+            modele.remplir(sentinelles)
+            reduire_texte_legal(doc, modele.paragraphes_champs)
+            tbls = [table._tbl for table in doc.tables[:len(tableaux)]]
+            if remplir is not None:
+                remplir(doc)
+            for tbl in tbls:
+                tbl.addprevious(etree.Comment("TABLEAU"))
+                tbl.addnext(etree.Comment("TABLEAU"))
+            return doc
+
+        def tableau(doc, index):
+            return etree.tostring(doc.element, encoding='UTF-8', standalone=True).split(b"<!--TABLEAU-->")[2 * index + 1]
+
+        doc = instance()
+        morceaux = etree.tostring(doc.element, encoding='UTF-8', standalone=True).split(b"<!--TABLEAU-->")
+        self.corps = [GabaritOctets(morceau) for morceau in morceaux[0::2]]
+        nb_tableaux = len(morceaux) // 2
+
+        for index, role in enumerate(tableaux[:nb_tableaux]):
+            variantes = {None: GabaritOctets(morceaux[2 * index + 1])}
+            if role == "coordonnees":
+                # Un point par case : assez de points pour chaque disposition et des cases vides
+                for nb_blocs, nb_points in ((1, 1), (2, 17), (3, 31)):
+                    lignes = math.ceil(nb_points / nb_blocs)
+                    points = [tuple(SENTINELLE.format(CELLULE + 3 * (i // lignes) + k) for k in range(3))
+                              for i in range(nb_points)]
+                    variantes[nb_blocs] = GabaritTableau(tableau(instance(
+                        lambda d: remplir_tableau_coordonnees(d, index, points)), index))
+            else:
+                beneficiaire = tuple(SENTINELLE.format(CELLULE + k) for k in range(3))
+                variantes['lignes'] = GabaritTableau(tableau(instance(
+                    lambda d: remplir_tableau_beneficiaires(d.tables[index], [beneficiaire])), index))
+            self.tableaux.append((role, variantes))
+
+        # Parties avec champs (en-têtes, pieds de page) hors corps
+        self.parties = {}
+        for part, _ in modele._parties[1:]:
+            self.parties[part.partname.lstrip('/')] = GabaritOctets(
+                etree.tostring(part.element, encoding='UTF-8', standalone=True))
+        self.nom_corps = modele._parties[0][0].partname.lstrip('/')
+
+        # Champs dont la valeur ne peut pas être insérée telle quelle
+        gabarits = self.corps + list(self.parties.values())
+        for _, variantes in self.tableaux:
+            for variante in variantes.values():
+                gabarits.extend((variante.debut, variante.fin) if isinstance(variante, GabaritTableau) else (variante,))
+        self._en_ligne = set().union(*(gabarit.numeros(False) for gabarit in gabarits))
+        substitution = modele._substitutions[frozenset(sentinelles)]
+        elements = [part.element for part, _ in modele._parties]
+        self._article = set()
+        for i_partie, i_para, regle in substitution.cibles:
+            if regle == "article":
+                texte = Paragraph(list(elements[i_partie].iter(qn('w:p')))[i_para], None).text
+                self._article.update(int(n) for n in re.findall(r'\ue000(\d+)\ue001', texte))
+
+        # Paquet : parties sans champs gardées compressées
+        flux = io.BytesIO()
+        doc.save(flux)
+        octets = flux.getvalue()
+        self._date, self._heure = _heure_dos(time.localtime())
+        self._entrees = []
+        with zipfile.ZipFile(io.BytesIO(octets)) as paquet:
+            for info in paquet.infolist():
+                if info.filename == self.nom_corps or info.filename in self.parties:
+                    self._entrees.append((info.filename, None))
+                    continue
+                longueur_nom, longueur_extra = struct.unpack('<2H', octets[info.header_offset + 26:
+                                                                           info.header_offset + 30])
+                debut = info.header_offset + 30 + longueur_nom + longueur_extra
+                self._entrees.append((info.filename, (info.compress_type, info.CRC, info.file_size,
+                                                      octets[debut:debut + info.compress_size])))
+
+    def _acceptable(self, valeurs):
+        for i, valeur in enumerate(valeurs):
+            if RE_HORS_XML.search(valeur) or any(mot in valeur for mot in MOTS_CLES_LEGAUX):
+                return False
+            if i in self._article and ':' in valeur:
+                return False
+            if i in self._en_ligne and (not valeur or valeur.strip() != valeur or RE_SEPARATEURS_RUN.search(valeur)):
+                return False
+        return True
+
+    def rendre(self, valeurs, lignes_tableaux):
+        """Octets du .docx pour les valeurs des champs (dans l'ordre de `cles`) et les lignes
+        de chaque rôle de tableau ; None si l'extrait doit passer par python-docx"""
+        if not self._acceptable(valeurs) or any(RE_HORS_XML.search(texte) for lignes in lignes_tableaux.values()
+                                                for ligne in lignes for texte in ligne):
+            return None
+        morceaux = [self.corps[0].rendre(valeurs)]
+        for (role, variantes), suite in zip(self.tableaux, self.corps[1:]):
+            lignes = lignes_tableaux.get(role)
+            if role == "coordonnees" and lignes:
+                nb_blocs, textes = disposition_coordonnees(lignes)
+                morceaux.append(variantes[nb_blocs].rendre(valeurs, textes))
+            elif role == "beneficiaires":
+                morceaux.append(variantes['lignes'].rendre(valeurs, lignes))
+            else:
+                morceaux.append(variantes[None].rendre(valeurs))
+            morceaux.append(suite.rendre(valeurs))
+        contenus = {self.nom_corps: b"".join(morceaux)}
+        for nom, gabarit in self.parties.items():
+            contenus[nom] = gabarit.rendre(valeurs)
+        return self._ecrire_zip(contenus)
+
+    def _ecrire_zip(self, contenus):
+        flux = io.BytesIO()
+        centrale = []
+        for nom, entree in self._entrees:
+            if entree is None:
+                donnees = contenus[nom]
+                compresseur = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                entree = (zipfile.ZIP_DEFLATED, zlib.crc32(donnees), len(donnees),
+                          compresseur.compress(donnees) + compresseur.flush())
+            methode, crc, taille, compresse = entree
+            nom_octets = nom.encode('utf-8')
+            position = flux.tell()
+            flux.write(struct.pack('<4s5H3L2H', b'PK\x03\x04', 20, 0, methode, self._heure, self._date, crc,
+                                   len(compresse), taille, len(nom_octets), 0))
+            flux.write(nom_octets)
+            flux.write(compresse)
+            centrale.append(struct.pack('<4s6H3L5H2L', b'PK\x01\x02', 20, 20, 0, methode, self._heure, self._date,
+                                        crc, len(compresse), taille, len(nom_octets), 0, 0, 0, 0, 0, position)
+                            + nom_octets)
+        debut = flux.tell()
+        repertoire = b"".join(centrale)
+        flux.write(repertoire)
+        flux.write(struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, len(centrale), len(centrale), len(repertoire),
+                               debut, 0))
+        return flux.getvalue()
+
+# === SORTIE ZIP ===
+class SortieZip:
+    """Archive résultat ouverte pendant toute la génération.
+
+    Chaque extrait est écrit directement dans son entrée ZIP : rien ne transite
+    par des fichiers intermédiaires sous /output, et aucune ré-archivage en fin
+    de traitement. La politique de compression s'applique à chaque entrée.
+    """
+    MODES = {'stocker': zipfile.ZIP_STORED, 'compresser': zipfile.ZIP_DEFLATED}
+
+    def __init__(self, chemin, compression=COMPRESSION_ZIP, dossiers=tuple(DOSSIERS.values())):
+        if compression not in self.MODES:
+            raise ValueError(f"Compression inconnue : {compression} (attendu : {', '.join(self.MODES)})")
+        self.chemin = chemin
+        self._compress_type = self.MODES[compression]
+        self._zip = zipfile.ZipFile(chemin, 'w', allowZip64=True)
+        self._horodatage = time.localtime()[:6]
+        self.nb_fichiers = 0
+        for dossier in dossiers:
+            self._zip.writestr(self._info(f"{dossier}/"), b"")
+
+    def _info(self, nom):
+        info = zipfile.ZipInfo(nom, date_time=self._horodatage)
+        if nom.endswith('/'):
+            info.external_attr = (0o40755 << 16) | 0x10
+        else:
+            info.external_attr = 0o644 << 16
+            info.compress_type = self._compress_type
+        return info
+
+    def ajouter(self, nom, donnees):
+        """Ajoute un fichier déjà sérialisé (bytes)"""
+        self._zip.writestr(self._info(nom), donnees)
+        self.nb_fichiers += 1
+
+    def ajouter_annexe(self, nom, donnees):
+        """Fichier d'accompagnement (manifeste, rapport) : non compté parmi les extraits"""
+        self._zip.writestr(self._info(nom), donnees)
+
+    def ouvrir_annexe(self, nom):
+        """Flux d'écriture vers une entrée annexe (document fusionné, rapport)"""
+        return self._zip.open(self._info(nom), 'w')
+
+    def ajouter_document(self, nom, doc):
+        """Sérialise un Document python-docx directement dans son entrée ZIP"""
+        with self._zip.open(self._info(nom), 'w') as flux:
+            doc.save(flux)
+        self.nb_fichiers += 1
+
+    @property
+    def taille(self):
+        """Octets déjà écrits dans l'archive"""
+        return self._zip.fp.tell()
+
+    def fermer(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+# === DOCUMENT FUSIONNÉ ===
+SAUT_DE_PAGE = b'<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+class DocumentFusionne:
+    """Tous les extraits d'un type réunis dans un seul .docx, construit au fil de l'eau.
+
+    Les extraits sortent tous du même modèle compilé : styles, numérotation et
+    relations sont ceux du paquet du modèle et ne sont repris qu'une fois. De chaque
+    extrait on ne garde que le contenu du corps, sérialisé dans un fichier tampon et
+    séparé par un saut de page ; aucun document n'est conservé en mémoire.
+    Les en-têtes et pieds de page, communs au document fusionné, sont vidés de leurs champs.
+    Avec `mesurer`, le corps est aussi compressé au fil de l'eau pour connaître à tout
+    moment un majorant de la taille du .docx final (archives de taille bornée).
+    """
+
+    def __init__(self, modele, mesurer=False):
+        self._paquet = modele.paquet()
+        self._debut, self._fin = modele.gabarit_corps()
+        self._tampon = tempfile.TemporaryFile()
+        self._id_dessin = 0
+        self.nb_extraits = 0
+        self._compresseur = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15) if mesurer else None
+        self._octets_compresses = 0
+        self.increment_max = 0
+
+    def taille_prevue(self):
+        """Majorant de la taille du .docx final (paquet du modèle + corps compressé), avec `mesurer`"""
+        return len(self._paquet) + len(self._debut) + len(self._fin) + self._octets_compresses
+
+    def ajouter(self, doc):
+        """Ajoute le corps d'un extrait rendu (le document est modifié : identifiants de dessins)"""
+        self._ajouter_corps(doc.element.body)
+
+    def ajouter_octets(self, octets):
+        """Ajoute un extrait déjà sérialisé (processus de travail, archive précédente)"""
+        from lxml import etree
+
+        with zipfile.ZipFile(io.BytesIO(octets)) as docx:
+            racine = etree.fromstring(docx.read('word/document.xml'))
+        self._ajouter_corps(racine.find(qn('w:body')))
+
+    def _ajouter_corps(self, body):
+        from lxml import etree
+
+        # Les identifiants de dessins doivent rester uniques dans le document fusionné
+        for doc_pr in body.iter(qn('wp:docPr')):
+            self._id_dessin += 1
+            doc_pr.set('id', str(self._id_dessin))
+
+        texte = etree.tostring(body)
+        debut = texte.index(b'>') + 1
+        if len(body) and body[-1].tag == qn('w:sectPr'):
+            fin = texte.rindex(b'<w:sectPr')
+        else:
+            fin = len(texte) - len(b'</w:body>')
+        fragment = (SAUT_DE_PAGE if self.nb_extraits else b"") + texte[debut:fin]
+        self._tampon.write(fragment)
+        self.nb_extraits += 1
+        if self._compresseur is not None:
+            increment = len(self._compresseur.compress(fragment)) + len(self._compresseur.flush(zlib.Z_SYNC_FLUSH))
+            self._octets_compresses += increment
+            self.increment_max = max(self.increment_max, increment)
 
-    # Créer les dossiers de sortie
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    output_indiv_dir = os.path.join(OUTPUT_DIR, "Individuelles")
-    output_coll_dir = os.path.join(OUTPUT_DIR, "Collectives")
-    os.makedirs(output_indiv_dir, exist_ok=True)
-    os.makedirs(output_coll_dir, exist_ok=True)
+    def ecrire(self, flux):
+        """Assemble le .docx final dans `flux` : parties du modèle + document.xml reconstitué"""
+        self._tampon.seek(0)
+        with zipfile.ZipFile(io.BytesIO(self._paquet)) as modele, \
+                zipfile.ZipFile(flux, 'w', zipfile.ZIP_DEFLATED) as docx:
+            for info in modele.infolist():
+                if info.filename != 'word/document.xml':
+                    docx.writestr(info.filename, modele.read(info.filename))
+                    continue
+                with docx.open('word/document.xml', 'w') as document:
+                    document.write(self._debut)
+                    for bloc in iter(lambda: self._tampon.read(1 << 20), b""):
+                        document.write(bloc)
+                    document.write(self._fin)
 
+    def fermer(self):
+        self._tampon.close()
+
+# === ARCHIVES PARTITIONNÉES ===
+# En-tête local ou entrée du répertoire central d'un fichier ZIP, hors nom (octets, descripteur compris)
+ENTETE_ZIP = 62
+
+def nom_partition(valeur, colonne):
+    """Valeur de partition → fragment de nom de fichier ASCII (accents retirés)"""
+    texte = unicodedata.normalize('NFKD', valeur).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^A-Za-z0-9]+', '_', texte).strip('_') or f"SANS_{colonne.upper()}"
+
+def cles_partition(taches, colonne, donnees):
+    """Nom de l'extrait → nom de partition, d'après la colonne `colonne` des feuilles de
+    délibérations (n'importe laquelle : ses valeurs sont relevées au chargement)"""
+    entetes = donnees['entetes']
+    if colonne not in entetes['indiv'] and colonne not in entetes['coll']:
+        disponibles = sorted({str(col) for col in entetes['indiv'] + entetes['coll']})
+        raise ValueError(f"Colonne de partition inconnue : {colonne} (disponibles : {', '.join(disponibles)})")
+    valeurs = donnees['partitions']
+    return {nom_extrait(type_extrait, enreg[0]): nom_partition(valeurs[type_extrait].get(enreg[0], ""), colonne)
+            for type_extrait, enreg, _, _ in taches}
+
+class SortiePartitionnee:
+    """Une archive par partition (village...) et/ou par tranche de taille, ouvertes une à la fois.
+
+    Même interface d'écriture que SortieZip. Les extraits doivent arriver groupés
+    par partition : une archive est terminée (documents fusionnés, manifeste de ses
+    extraits) et mise en place avant l'ouverture de la suivante, puis signalée par
+    un événement 'archive' pour que l'hôte puisse la récupérer et la libérer.
+    Avec `taille_max`, une nouvelle archive est ouverte avant l'extrait qui ferait
+    dépasser le plafond à l'archive terminée : extraits, plus majorants des documents
+    fusionnés (corps compressé au fil de l'eau), du manifeste, des annexes et du
+    répertoire central. Seul un extrait plus gros que le plafond à lui seul peut
+    encore le dépasser. `annexes` (nom → octets,
+    les rapports du run) est joint à chaque archive au moment où elle est terminée :
+    un rapport ajouté en cours de route (profilage) ne rejoint que la dernière.
+    """
+
+    def __init__(self, dossier, partitions, compression=COMPRESSION_ZIP, taille_max=None, modeles_fusion=None,
+                 manifeste=None, progression=None, annexes=None):
+        self.dossier = dossier
+        self.partitions = partitions
+        self.compression = compression
+        self.taille_max = taille_max
+        self.modeles_fusion = modeles_fusion or {}
+        self.manifeste = manifeste
+        self.progression = progression or Progression()
+        self.annexes = annexes if annexes is not None else {}
+        self.archives = []
+        self.nb_fichiers = 0
+        self._zip = None
+        self._cle = None
+        self._numero = 0
+        self._fusions = {}
+        self._noms = []
+        self._entree_manifeste = 0
+
+    def _chemin(self, cle):
+        base = os.path.splitext(NOM_ZIP_RESULTAT)[0]
+        morceaux = [base] + ([cle] if cle else []) + ([f"{self._numero:03d}"] if self.taille_max else [])
+        return os.path.join(self.dossier, "_".join(morceaux) + ".zip")
+
+    def _taille_finale(self, nom, taille):
+        """Majorant de la taille de l'archive en cours une fois `nom` (`taille` octets) ajouté et l'archive terminée"""
+        # Entrée ZIP : en-tête local, descripteur et entrée du répertoire central
+        entete = 2 * (len(nom) + ENTETE_ZIP)
+        prevue = self._zip.taille + taille + entete + len(self._noms) * entete
+        for type_extrait, fusion in self._fusions.items():
+            prevue += fusion.taille_prevue() + (fusion.increment_max if type_extrait == nom_type(nom) else 0)
+            prevue += 2 * (len(NOMS_FUSION[type_extrait]) + ENTETE_ZIP)
+        if self.manifeste is not None:
+            if self._noms and not self._entree_manifeste:
+                self._entree_manifeste = (len(self.manifeste.vers_json(self._noms[:1]))
+                                          - len(self.manifeste.vers_json([])))
+            prevue += len(self.manifeste.vers_json([])) + (len(self._noms) + 1) * self._entree_manifeste
+            prevue += 2 * (len(NOM_MANIFESTE) + ENTETE_ZIP)
+        prevue += sum(len(contenu) + 2 * (len(nom_annexe) + ENTETE_ZIP) for nom_annexe, contenu in self.annexes.items())
+        # Marge pour les documents fusionnés, recompressés dans l'archive
+        return int(prevue * 1.01)
+
+    def _preparer(self, nom, taille):
+        """Ouvre l'archive qui doit recevoir `nom` (changement de partition ou plafond atteint)"""
+        cle = self.partitions.get(nom, "")
+        if self._zip is not None and cle == self._cle:
+            if not self.taille_max or not self._noms or self._taille_finale(nom, taille) <= self.taille_max:
+                return
+        self._terminer()
+        self._numero = self._numero + 1 if cle == self._cle else 1
+        self._cle = cle
+        self._zip = SortieZip(self._chemin(cle) + ".partiel", self.compression)
+        self._fusions = {type_extrait: DocumentFusionne(modele, mesurer=bool(self.taille_max))
+                         for type_extrait, modele in self.modeles_fusion.items()}
+        self._entree_manifeste = 0
+
+    def ajouter(self, nom, donnees):
+        self._preparer(nom, len(donnees))
+        self._zip.ajouter(nom, donnees)
+        self._noms.append(nom)
+        self.nb_fichiers += 1
+        fusion = self._fusions.get(nom_type(nom))
+        if fusion is not None:
+            fusion.ajouter_octets(donnees)
+
+    def ajouter_document(self, nom, doc):
+        if self.taille_max:
+            # Taille exacte de l'extrait avant de choisir son archive
+            flux = io.BytesIO()
+            doc.save(flux)
+            self._preparer(nom, flux.tell())
+            self._zip.ajouter(nom, flux.getvalue())
+        else:
+            self._preparer(nom, 0)
+            self._zip.ajouter_document(nom, doc)
+        self._noms.append(nom)
+        self.nb_fichiers += 1
+        fusion = self._fusions.get(nom_type(nom))
+        if fusion is not None:
+            fusion.ajouter(doc)
+
+    def _terminer(self):
+        if self._zip is None:
+            return
+        for type_extrait, fusion in self._fusions.items():
+            if fusion.nb_extraits:
+                with self._zip.ouvrir_annexe(NOMS_FUSION[type_extrait]) as flux:
+                    fusion.ecrire(flux)
+            fusion.fermer()
+        if self.manifeste is not None:
+            self._zip.ajouter_annexe(NOM_MANIFESTE, self.manifeste.vers_json(self._noms))
+        for nom, contenu in self.annexes.items():
+            # Un rapport arrivé après le dernier extrait (profilage) n'a pas été prévu : à côté seulement s'il déborde
+            repertoire = (len(self._noms) + len(self.annexes) + 4) * (ENTETE_ZIP + len(nom))
+            if self.taille_max and self._zip.taille + len(contenu) + repertoire > self.taille_max:
+                log(f"   ⚠️ {nom} laissé hors de {os.path.basename(self._chemin(self._cle))} (plafond atteint)")
+                continue
+            self._zip.ajouter_annexe(nom, contenu)
+        self._zip.fermer()
+        chemin = self._zip.chemin[:-len(".partiel")]
+        os.replace(self._zip.chemin, chemin)
+        self.archives.append(chemin)
+        log(f"   📦 {os.path.basename(chemin)} : {len(self._noms)} extraits")
+        self.progression.emettre('archive', chemin=chemin, extraits=len(self._noms), octets=os.path.getsize(chemin))
+        self._zip, self._fusions, self._noms = None, {}, []
+
+    def abandonner(self):
+        """Archive en cours supprimée ; les archives déjà terminées restent"""
+        if self._zip is not None:
+            self._zip.fermer()
+            for fusion in self._fusions.values():
+                fusion.fermer()
+            os.remove(self._zip.chemin)
+            self._zip = None
+
+    def fermer(self):
+        self._terminer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_exc, *exc):
+        if type_exc is None:
+            self.fermer()
+        else:
+            self.abandonner()
+
+# === RÉGÉNÉRATION INCRÉMENTALE ===
+# À incrémenter quand le rendu change : toutes les empreintes précédentes deviennent caduques
+VERSION_RENDU = 3
+
+def empreinte_fichier(chemin):
+    h = hashlib.sha256()
+    with open(chemin, 'rb') as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+class Manifeste:
+    """Empreintes des entrées de chaque extrait, comparées à celles d'un run précédent.
+
+    L'empreinte d'une parcelle couvre sa ligne préparée, ses sommets formatés et
+    le modèle utilisé. Un extrait dont l'empreinte n'a pas changé est recopié
+    tel quel depuis l'archive précédente au lieu d'être rendu à nouveau.
+    """
+
+    def __init__(self, empreintes_modeles, chemin_zip_precedent=None):
+        self.empreintes_modeles = empreintes_modeles
+        self.extraits = {}
+        self.ajoutes, self.modifies, self.reutilises = [], [], []
+        self._precedents = {}
+        self._zip_precedent = None
+        if chemin_zip_precedent and os.path.exists(chemin_zip_precedent):
+            self._ouvrir(chemin_zip_precedent)
+
+    def _ouvrir(self, chemin_zip):
+        try:
+            self._zip_precedent = zipfile.ZipFile(chemin_zip)
+            contenu = self._zip_precedent.read(NOM_MANIFESTE)
+        except (KeyError, zipfile.BadZipFile):
+            # Manifeste déposé à côté de l'archive (ou archive absente / illisible)
+            chemin_json = os.path.join(os.path.dirname(chemin_zip), NOM_MANIFESTE)
+            if not os.path.exists(chemin_json):
+                log("   ⚠️ Archive précédente sans manifeste : régénération complète")
+                return
+            with open(chemin_json, 'rb') as f:
+                contenu = f.read()
+        precedent = json.loads(contenu)
+        self._precedents = precedent.get('extraits', {})
+        log(f"   ♻️ Manifeste précédent : {len(self._precedents)} extraits")
+
+    @property
+    def actif(self):
+        return bool(self._precedents)
+
+    def empreinte(self, type_extrait, enreg, points):
+        h = hashlib.sha256(f"{VERSION_RENDU}\x1e{self.empreintes_modeles[type_extrait]}".encode())
+        for valeur in enreg:
+            h.update(b"\x1f" + valeur.encode())
+        for point in points:
+            h.update(("\x1e" + "\x1f".join(point)).encode())
+        return h.hexdigest()
+
+    def reprendre(self, nom, empreinte):
+        """Contenu de l'extrait précédent si ses entrées sont inchangées, sinon None"""
+        if self._zip_precedent is None or self._precedents.get(nom, {}).get('empreinte') != empreinte:
+            return None
+        try:
+            return self._zip_precedent.read(nom)
+        except KeyError:
+            return None
+
+    def enregistrer(self, nom, nicad, type_extrait, empreinte):
+        precedente = self._precedents.get(nom)
+        if precedente is None:
+            self.ajoutes.append(nicad)
+        elif precedente['empreinte'] != empreinte:
+            self.modifies.append(nicad)
+        else:
+            self.reutilises.append(nicad)
+        self.extraits[nom] = {'nicad': nicad, 'type': type_extrait, 'empreinte': empreinte}
+
+    def supprimes(self):
+        return sorted(e['nicad'] for nom, e in self._precedents.items() if nom not in self.extraits)
+
+    def rapport(self):
+        return {
+            'ajoutes': self.ajoutes,
+            'modifies': self.modifies,
+            'supprimes': self.supprimes(),
+            'reutilises': self.reutilises,
+        }
+
+    def vers_json(self, noms=None):
+        """Manifeste complet, ou limité aux extraits `noms` (archive partitionnée, sans rapport)"""
+        if noms is not None:
+            contenu = {'extraits': {nom: self.extraits[nom] for nom in noms if nom in self.extraits}}
+        else:
+            contenu = {'extraits': self.extraits, 'rapport': self.rapport()}
+        return json.dumps({
+            'version': VERSION_RENDU,
+            'modeles': self.empreintes_modeles,
+            **contenu,
+        }, ensure_ascii=False, indent=1).encode('utf-8')
+
+    def fermer(self):
+        if self._zip_precedent is not None:
+            self._zip_precedent.close()
+
+class ModelesCompiles:
+    """Modèles compilés gardés d'un run à l'autre dans la même session, par empreinte du
+    fichier : un modèle partagé par plusieurs communes n'est compilé qu'une fois"""
+
+    def __init__(self):
+        self._modeles = {}
+        self.succes = 0
+
+    def obtenir(self, chemin):
+        cle = empreinte_fichier(chemin)
+        modele = self._modeles.get(cle)
+        if modele is None:
+            modele = self._modeles[cle] = ModeleCompile(chemin)
+        else:
+            self.succes += 1
+            log(f"   ⚡ {os.path.basename(chemin)} déjà compilé")
+        return modele
+
+    def __len__(self):
+        return len(self._modeles)
+
+# === CACHE DES ENTRÉES ===
+# À incrémenter dès que la forme des données mises en cache change (colonnes, nettoyage)
+VERSION_CACHE = 3
+
+class CacheEntrees:
+    """Tables analysées et normalisées, rangées par empreinte du fichier source.
+
+    Chaque entrée est un pickle de structures natives en colonnes (listes de chaînes,
+    array('d')) : relire une commune déjà vue ne repasse plus par openpyxl. Au-delà
+    de `taille_max` octets, les entrées les moins récemment utilisées sont supprimées.
+    """
+
+    def __init__(self, dossier=DOSSIER_CACHE, taille_max=TAILLE_MAX_CACHE_MO * 1024 * 1024):
+        self.dossier = dossier
+        self.taille_max = taille_max
+        self.succes = 0
+        os.makedirs(dossier, exist_ok=True)
+
+    def _chemin(self, chemin_source, sorte):
+        h = hashlib.sha256(f"{VERSION_CACHE}|{sorte}|{empreinte_fichier(chemin_source)}".encode())
+        return os.path.join(self.dossier, h.hexdigest()[:32] + ".pkl")
+
+    def obtenir(self, chemin_source, sorte, construire):
+        """Valeur en cache pour (contenu du fichier, sorte), sinon construite et enregistrée"""
+        chemin = self._chemin(chemin_source, sorte)
+        try:
+            with open(chemin, 'rb') as f:
+                valeur = pickle.load(f)
+            os.utime(chemin)
+            self.succes += 1
+            return valeur
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # Entrée illisible (écriture interrompue, autre version de Python) : reconstruite
+            os.remove(chemin)
+
+        valeur = construire()
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, 'wb') as f:
+            pickle.dump(valeur, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaire, chemin)
+        self.evincer()
+        return valeur
+
+    def evincer(self):
+        entrees = []
+        for nom in os.listdir(self.dossier):
+            if nom.endswith(".pkl"):
+                stat = os.stat(os.path.join(self.dossier, nom))
+                entrees.append((stat.st_mtime, stat.st_size, nom))
+        total = sum(taille for _, taille, _ in entrees)
+        for _, taille, nom in sorted(entrees):
+            if total <= self.taille_max:
+                break
+            os.remove(os.path.join(self.dossier, nom))
+            total -= taille
+
+def _en_colonnes(enregistrements):
+    return [list(colonne) for colonne in zip(*enregistrements)]
+
+def _depuis_colonnes(colonnes):
+    return list(zip(*colonnes))
+
+# === ÉVÉNEMENTS DE PROGRESSION ===
+def memoire_wasm_mo():
+    """Taille du tas WebAssembly de Pyodide (Mo), None hors navigateur"""
+    try:
+        import pyodide_js
+        return round(pyodide_js._module.HEAP8.length / (1024 * 1024), 1)
+    except (ImportError, AttributeError):
+        return None
+
+def memoire_courante_mo():
+    """Mémoire résidente actuelle du processus (Mo) ; sous Pyodide, taille du tas WebAssembly.
+    None si le système ne l'expose pas"""
+    if sys.platform == "emscripten":
+        return memoire_wasm_mo()
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+def memoire_max_mo():
+    """Pic de mémoire résidente du processus (Mo), None si indisponible (Windows). Sous
+    Pyodide, taille du tas WebAssembly : il grandit sans jamais rendre, c'est aussi son pic"""
+    if sys.platform == "emscripten":
+        return memoire_wasm_mo()
+    try:
+        import resource
+    except ImportError:
+        return None
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : Ko, macOS : octets
+    return round(pic / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+class Progression:
+    """Canal d'événements structurés (dicts sérialisables en JSON) vers un rappel.
+
+    Événements : etape_debut / etape_fin (erreur=True si l'étape a échoué ou a été
+    interrompue), progression (au plus un par `cadence` secondes, plus le dernier),
+    erreur (immédiat, par NICAD) et fin. Sans rappel, les événements sont ignorés et
+    le coût se limite à quelques compteurs.
+    """
+
+    def __init__(self, rappel=None, cadence=CADENCE_PROGRESSION):
+        self.rappel = rappel
+        self.cadence = cadence
+        self.debut = time.perf_counter()
+        self.total = 0
+        self.faits = {'PI': 0, 'PC': 0}
+        self.erreurs = {}
+        self.nb_erreurs = 0
+        self.etapes = {}
+        self._debut_rendu = self.debut
+        self._dernier = None
+
+    def emettre(self, evenement, **donnees):
+        if self.rappel is not None:
+            self.rappel({'evenement': evenement, 'ecoule_s': round(time.perf_counter() - self.debut, 3), **donnees})
+
+    @contextlib.contextmanager
+    def etape(self, nom):
+        """Étape chronométrée ; etape_fin est émis même si elle échoue (avec erreur=True)"""
+        debut = time.perf_counter()
+        self.emettre('etape_debut', etape=nom)
+        issue = {'erreur': True}
+        try:
+            yield
+            issue = {}
+        finally:
+            duree = round(time.perf_counter() - debut, 3)
+            self.etapes[nom] = {'duree_s': duree, 'memoire_mo': memoire_courante_mo(), **issue}
+            self.emettre('etape_fin', etape=nom, duree_s=duree, **issue)
+
+    def demarrer(self, total):
+        """Début du rendu : `total` extraits à produire (repris compris)"""
+        self.total = total
+        self._debut_rendu = time.perf_counter()
+        self._dernier = None
+
+    def avancer(self, type_extrait):
+        self.faits[type_extrait] += 1
+        if self.rappel is None:
+            return
+        maintenant = time.perf_counter()
+        faits = self.faits['PI'] + self.faits['PC']
+        restants = max(self.total - faits - self.nb_erreurs, 0)
+        if self._dernier is not None and maintenant - self._dernier < self.cadence and restants:
+            return
+        self._dernier = maintenant
+        duree = maintenant - self._debut_rendu
+        debit = faits / duree if duree > 0 else None
+        self.emettre('progression', faits=faits, faits_pi=self.faits['PI'], faits_pc=self.faits['PC'],
+                     restants=restants, total=self.total,
+                     docs_par_seconde=round(debit, 2) if debit else None,
+                     eta_s=round(restants / debit, 1) if debit else None,
+                     erreurs=self.nb_erreurs, memoire_mo=memoire_courante_mo())
+
+    def erreur(self, nicad, message):
+        self.erreurs[nicad] = self.erreurs.get(nicad, 0) + 1
+        self.nb_erreurs += 1
+        self.emettre('erreur', nicad=nicad, message=message, erreurs=self.nb_erreurs)
+
+    def terminer(self, **bilan):
+        self.emettre('fin', faits=self.faits['PI'] + self.faits['PC'], erreurs_par_nicad=self.erreurs,
+                     memoire_mo=memoire_courante_mo(), **bilan)
+
+# === PROFILAGE ===
+def chronometrer(profilage, sous_etape, fonction, *args):
+    """fonction(*args), sa durée cumulée dans `sous_etape` du profilage s'il y en a un"""
+    if profilage is None:
+        return fonction(*args)
+    debut = time.perf_counter()
+    try:
+        return fonction(*args)
+    finally:
+        profilage.cumuler(sous_etape, time.perf_counter() - debut)
+
+class Profilage:
+    """Mesures d'un run pour trouver ce qui le ralentit : durée de chaque étape (relevée
+    par Progression), de chaque parcelle rendue et des sous-étapes (nettoyage des NICAD,
+    recherche des coordonnées, remplissage des tableaux, sauvegarde, zip, ajout au
+    document fusionné : processus courant seulement), plus, en option, cProfile et
+    tracemalloc autour de la boucle de rendu. `rapports` produit le JSON joint à
+    l'archive (et les statistiques cProfile brutes, lisibles par pstats / snakeviz).
+    """
+
+    def __init__(self, cprofile=False, memoire=False, top=TOP_PROFIL):
+        self.cprofile = cprofile
+        self.memoire = memoire
+        self.top = top
+        self.parcelles = []
+        self.sous_etapes = {}
+        self.processus = 1
+        self._profil = None
+        self._memoire = None
+
+    def copie(self):
+        """Profilage vierge aux mêmes réglages (un par run)"""
+        return Profilage(self.cprofile, self.memoire, self.top)
+
+    def parcelle(self, type_extrait, nicad, duree):
+        self.parcelles.append((duree, type_extrait, nicad))
+
+    def cumuler(self, sous_etape, duree):
+        self.sous_etapes[sous_etape] = self.sous_etapes.get(sous_etape, 0.0) + duree
+
+    @contextlib.contextmanager
+    def rendu(self):
+        """Boucle de rendu sous cProfile et/ou tracemalloc (processus courant uniquement)"""
+        if self.memoire:
+            tracemalloc.start()
+        if self.cprofile:
+            self._profil = cProfile.Profile()
+            self._profil.enable()
+        try:
+            yield
+        finally:
+            if self._profil is not None:
+                self._profil.disable()
+            if self.memoire:
+                actuelle, pic = tracemalloc.get_traced_memory()
+                sites = tracemalloc.take_snapshot().statistics('lineno')[:self.top]
+                tracemalloc.stop()
+                self._memoire = {
+                    'pic_python_mo': round(pic / (1024 * 1024), 2),
+                    'fin_python_mo': round(actuelle / (1024 * 1024), 2),
+                    'sites': [{'site': str(site.traceback), 'taille_ko': round(site.size / 1024, 1),
+                               'allocations': site.count} for site in sites],
+                }
+
+    def _parcelles_lentes(self, donnees):
+        debut = 1 + len(CHAMPS_COLL)
+        collectives = {enreg[0]: enreg for enreg in donnees['PC']}
+        lentes = []
+        for duree, type_extrait, nicad in sorted(self.parcelles, key=lambda p: p[0], reverse=True)[:self.top]:
+            index = donnees['index_pi'] if type_extrait == 'PI' else donnees['index_pc']
+            parcelle = {'type': type_extrait, 'nicad': nicad, 'duree_ms': round(duree * 1000, 2),
+                        'sommets': index.nb_points(nicad)}
+            if type_extrait == 'PC' and nicad in collectives:
+                parcelle['beneficiaires'] = len(donnees['beneficiaires'].obtenir(nicad, collectives[nicad][debut:]))
+            lentes.append(parcelle)
+        return lentes
+
+    def _fonctions_chaudes(self):
+        stats = pstats.Stats(self._profil)
+        fonctions = sorted(stats.stats.items(), key=lambda f: f[1][2], reverse=True)[:self.top]
+        return [{'fonction': f"{os.path.basename(fichier)}:{ligne}({nom})", 'appels': nb_appels,
+                 'propre_s': round(propre, 4), 'cumule_s': round(cumule, 4)}
+                for (fichier, ligne, nom), (_, nb_appels, propre, cumule, _) in fonctions]
+
+    def rapports(self, progression, donnees):
+        """{nom: octets} des rapports de profilage, à joindre à l'archive"""
+        durees = sorted(duree for duree, _, _ in self.parcelles)
+        rapport = {
+            'etapes': progression.etapes,
+            'sous_etapes': {nom: round(duree, 3) for nom, duree in self.sous_etapes.items()},
+            'processus': self.processus,
+            'parcelles': {
+                'rendues': len(durees),
+                'total_s': round(sum(durees), 3),
+                'moyenne_ms': round(sum(durees) / len(durees) * 1000, 2) if durees else None,
+                'mediane_ms': round(durees[len(durees) // 2] * 1000, 2) if durees else None,
+                'p95_ms': round(durees[int(len(durees) * 0.95)] * 1000, 2) if durees else None,
+                'plus_lentes': self._parcelles_lentes(donnees),
+            },
+            'memoire': {'pic_processus_mo': memoire_max_mo(), 'fin_mo': memoire_courante_mo()},
+        }
+        if self._memoire is not None:
+            rapport['memoire'].update(self._memoire)
+        rapports = {}
+        if self._profil is not None:
+            rapport['fonctions_chaudes'] = self._fonctions_chaudes()
+            rapports[NOM_STATS_PROFIL] = marshal.dumps(pstats.Stats(self._profil).stats)
+        if self.processus > 1:
+            rapport['remarque'] = ("rendu réparti sur plusieurs processus : durées par parcelle mesurées dans les "
+                                   "processus de travail, cProfile et tracemalloc limités au processus principal")
+        rapports[NOM_RAPPORT_PROFIL] = json.dumps(rapport, ensure_ascii=False, indent=1).encode('utf-8')
+
+        log("\n⏱️ Profil :")
+        for nom, etape in progression.etapes.items():
+            log(f"   {nom} : {etape['duree_s']} s")
+        for parcelle in rapport['parcelles']['plus_lentes'][:5]:
+            log(f"   🐢 {parcelle['type']} {parcelle['nicad']} : {parcelle['duree_ms']} ms, "
+                f"{parcelle['sommets']} sommets")
+        return rapports
+
+def rappel_json(flux):
+    """Rappel qui écrit chaque événement en JSON, une ligne par événement"""
+    def ecrire(evenement):
+        flux.write(json.dumps(evenement, ensure_ascii=False) + "\n")
+        flux.flush()
+    return ecrire
+
+# === CONTRÔLE PRÉALABLE ===
+# Anomalies qui rendent des extraits faux ou incomplets ; les autres sont signalées seulement
+ANOMALIES_BLOQUANTES = ("colonnes_absentes", "champs_sans_colonne", "nicads_doublons", "nicads_vides",
+                        "sans_coordonnees", "beneficiaires_incoherents", "sans_beneficiaire")
+ANOMALIES_PREALABLES = ANOMALIES_BLOQUANTES + ("coordonnees_orphelines",)
+# Tableaux du corps reconstruits au rendu (coordonnées, bénéficiaires) : leurs champs ne sont pas des colonnes
+TABLEAUX_REMPLIS = {'PI': 1, 'PC': 2}
+
+def champs_modele(chemin, tableaux_ignores=0):
+    """Champs «...» d'un modèle (corps, tableaux, en-têtes et pieds de page),
+    hors des `tableaux_ignores` premiers tableaux du corps"""
+    doc = Document(chemin)
+    ignores = {table._tbl for table in doc.tables[:tableaux_ignores]}
+    champs = set()
+    for part in _parties_texte(doc):
+        for p in part.element.iter(qn('w:p')):
+            if ignores and any(ancetre in ignores for ancetre in p.iterancestors(qn('w:tbl'))):
+                continue
+            champs.update(RE_CHAMP.findall(Paragraph(p, None).text))
+    return champs
+
+def controler_entrees(fichiers, donnees):
+    """Rapport préalable au rendu sur les quatre classeurs et les deux modèles.
+
+    Index construits une fois (NICAD → nombre de lignes, index des sommets) :
+    parcelles sans sommets et sommets sans parcelle de chaque côté des deux
+    jointures, NICAD en double ou vides, bénéficiaires absents ou dont les
+    cellules Prenom / Nom / pièce n'ont pas le même nombre de lignes, colonnes
+    attendues absentes et champs des modèles sans colonne correspondante. Les
+    en-têtes sont ceux relevés au chargement (ou repris du cache) : aucun
+    classeur n'est rouvert.
+    """
+    details = {anomalie: [] for anomalie in ANOMALIES_PREALABLES}
+
+    entetes = {cle: set(colonnes) for cle, colonnes in donnees['entetes'].items()}
+    attendues = {
+        'indiv': set(_colonnes_indiv(entetes['indiv'])),
+        'coll': set(_colonnes_coll(entetes['coll'])),
+        'coord_pi': set(IndexCoordonnees.colonnes_requises(entetes['coord_pi'])),
+        'coord_pc': set(IndexCoordonnees.colonnes_requises(entetes['coord_pc'])),
+    }
+    for cle, colonnes in attendues.items():
+        for colonne in sorted(colonnes - entetes[cle]):
+            details['colonnes_absentes'].append({'fichier': os.path.basename(fichiers[cle]), 'colonne': colonne})
+
+    for type_extrait, tpl, cle, champs in (('PI', 'tpl_indiv', 'indiv', CHAMPS_INDIV),
+                                           ('PC', 'tpl_coll', 'coll', CHAMPS_COLL)):
+        colonnes = dict(champs)
+        for champ in sorted(champs_modele(fichiers[tpl], TABLEAUX_REMPLIS[type_extrait])):
+            if colonnes.get(champ) not in entetes[cle]:
+                details['champs_sans_colonne'].append({'type': type_extrait, 'champ': champ,
+                                                       'colonne': colonnes.get(champ)})
+
+    for type_extrait, index in (('PI', donnees['index_pi']), ('PC', donnees['index_pc'])):
+        lignes = {}
+        for enreg in donnees[type_extrait]:
+            lignes[enreg[0]] = lignes.get(enreg[0], 0) + 1
+        for nicad, nb in lignes.items():
+            if not nicad:
+                details['nicads_vides'].append({'type': type_extrait, 'lignes': nb})
+                continue
+            if nb > 1:
+                details['nicads_doublons'].append({'type': type_extrait, 'nicad': nicad, 'lignes': nb})
+            if nicad not in index:
+                details['sans_coordonnees'].append({'type': type_extrait, 'nicad': nicad})
+        details['coordonnees_orphelines'].extend(
+            {'type': type_extrait, 'nicad': nicad} for nicad in index.nicads() if nicad not in lignes)
+        log(f"   🔍 [DIAGNOSTIC] Correspondance {type_extrait}: {sum(1 for nicad in lignes if nicad in index)} "
+            f"/ {len(lignes)}")
+
+    details['sans_beneficiaire'].extend({'nicad': nicad} for nicad in donnees['beneficiaires'].sans_beneficiaire)
+    details['beneficiaires_incoherents'].extend(donnees['beneficiaires'].incoherents)
+
+    anomalies = {anomalie: len(liste) for anomalie, liste in details.items()}
+    bloquantes = sum(anomalies[anomalie] for anomalie in ANOMALIES_BLOQUANTES)
+    log(f"   🧪 Contrôle préalable : {bloquantes} anomalies bloquantes")
+    for anomalie, nb in anomalies.items():
+        if nb:
+            log(f"      {'❌' if anomalie in ANOMALIES_BLOQUANTES else '⚠️'} {anomalie} : {nb}")
+    return {'bloquantes': bloquantes, 'anomalies': anomalies, 'details': details}
+
+# === CONTRÔLE GÉOMÉTRIQUE ===
+ANOMALIES_GEOMETRIE = ("ecart_superficie", "polygone_degenere", "sommets_doublons", "coordonnees_manquantes",
+                       "sans_coordonnees")
+
+def _superficie(valeur):
+    return _flottant(str(valeur).replace(" ", "").replace(",", ".")) if valeur else math.nan
+
+def controler_geometrie(donnees, tolerance=TOLERANCE_SUPERFICIE):
+    """Rapport géométrique de toutes les parcelles (PI et PC), calculé sur l'index des sommets.
+
+    Signale les parcelles dont l'aire calculée s'écarte de la superficie déclarée
+    de plus de `tolerance` (relatif), les polygones dégénérés (moins de 3 sommets
+    distincts ou aire nulle), les sommets répétés, les coordonnées manquantes et
+    les parcelles sans sommets. Retourne None si numpy n'est pas disponible.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        log("   ⚠️ numpy indisponible : contrôle géométrique ignoré")
+        return None
+
+    comptes = dict.fromkeys(ANOMALIES_GEOMETRIE, 0)
+    signalees = []
+    nb_parcelles = nb_fermees = 0
+    for type_extrait, index, champs in (('PI', donnees['index_pi'], CHAMPS_INDIV),
+                                        ('PC', donnees['index_pc'], CHAMPS_COLL)):
+        i_superficie = 1 + [col for _, col in champs].index('superficie')
+        # Première ligne d'un NICAD en double : celle qui est rendue (planifier)
+        declarees = {}
+        for enreg in donnees[type_extrait]:
+            declarees.setdefault(enreg[0], _superficie(enreg[i_superficie]))
+        nb_parcelles += len(declarees)
+
+        for nicad in (nicad for nicad in declarees if nicad not in index):
+            comptes['sans_coordonnees'] += 1
+            signalees.append({'type': type_extrait, 'nicad': nicad, 'anomalies': ["sans_coordonnees"]})
+        nicads, m = index.mesures()
+        if m is None:
+            continue
+
+        # Seules les parcelles délibérées sont contrôlées
+        superficies = np.array([declarees.get(nicad, math.nan) for nicad in nicads])
+        retenues = np.fromiter((nicad in declarees for nicad in nicads), dtype=bool, count=len(nicads))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ecarts = np.abs(m['aire'] - superficies) / superficies
+        drapeaux = {
+            'ecart_superficie': retenues & (ecarts > tolerance),
+            'polygone_degenere': retenues & ((m['sommets'] - m['doublons'] < 3) | (m['aire'] == 0)),
+            'sommets_doublons': retenues & (m['doublons'] > 0),
+            'coordonnees_manquantes': retenues & (m['manquants'] > 0),
+        }
+        nb_fermees += int(np.count_nonzero(retenues & m['ferme']))
+        for anomalie, masque in drapeaux.items():
+            comptes[anomalie] += int(np.count_nonzero(masque))
+
+        # Détail uniquement pour les parcelles signalées
+        for i in np.flatnonzero(np.logical_or.reduce(list(drapeaux.values()))).tolist():
+            signalees.append({
+                'type': type_extrait,
+                'nicad': nicads[i],
+                'superficie': None if math.isnan(superficies[i]) else float(superficies[i]),
+                'aire_calculee': None if math.isnan(m['aire'][i]) else round(float(m['aire'][i]), 2),
+                'ecart': None if not math.isfinite(ecarts[i]) else round(float(ecarts[i]), 4),
+                'perimetre': None if math.isnan(m['perimetre'][i]) else round(float(m['perimetre'][i]), 2),
+                'sommets': int(m['sommets'][i]),
+                'doublons': int(m['doublons'][i]),
+                'ferme': bool(m['ferme'][i]),
+                'anomalies': [anomalie for anomalie, masque in drapeaux.items() if masque[i]],
+            })
+
+    log(f"   📐 Contrôle géométrique : {len(signalees)} parcelles signalées sur {nb_parcelles}")
+    for anomalie, nb in comptes.items():
+        if nb:
+            log(f"      ⚠️ {anomalie} : {nb}")
+    return {
+        'tolerance': tolerance,
+        'parcelles': nb_parcelles,
+        'polygones_fermes': nb_fermees,
+        'anomalies': comptes,
+        'parcelles_signalees': signalees,
+    }
+
+# === MOTEUR ===
+def _lire_enregistrements(chemin, chargeur, colonnes, partition=None, profilage=None):
+    """(en-têtes, enregistrements en colonnes, valeurs de la colonne `partition`) d'une feuille
+    de délibérations (forme mise en cache)"""
+    table = lire_classeur(chemin, chargeur)
+    valeurs = [valeur for valeur, in preparer_enregistrements(table, (partition,))] if partition else None
+    enregs = preparer_enregistrements(table, colonnes(table.columns), profilage)
+    return list(table.columns), _en_colonnes(enregs), valeurs
+
+def _valeurs_partition(enregs, valeurs):
+    """NICAD → valeur de partition (première ligne en cas de doublon, comme planifier)"""
+    par_nicad = {}
+    for enreg, valeur in zip(enregs, valeurs):
+        par_nicad.setdefault(enreg[0], valeur)
+    return par_nicad
+
+def _colonnes_indiv(columns):
+    return ('nicad',) + tuple(col for _, col in CHAMPS_INDIV)
+
+def _colonnes_coll(columns):
+    col_piece = 'Numero_piece' if 'Numero_piece' in columns else 'Num_piece'
+    return ('nicad',) + tuple(col for _, col in CHAMPS_COLL) + ('Prenom', 'Nom', col_piece)
+
+def charger_donnees(fichiers, chargeur=CHARGEUR, cache=None, partition=None, profilage=None):
+    """Charge les quatre classeurs et prépare enregistrements et index de coordonnées.
+
+    Avec un `cache` (CacheEntrees), un classeur déjà analysé n'est pas relu. Avec
+    `partition`, les valeurs de cette colonne des feuilles de délibérations sont
+    relevées dans la même passe (donnees['partitions'], NICAD → valeur par type).
+    Avec `profilage`, le nettoyage des NICAD des classeurs relus est chronométré.
+    """
+    def obtenir(cle, sorte, construire):
+        if cache is None:
+            return construire()
+        succes = cache.succes
+        valeur = cache.obtenir(fichiers[cle], sorte, construire)
+        if cache.succes > succes:
+            log(f"   ⚡ {os.path.basename(fichiers[cle])} repris du cache")
+        return valeur
+
+    # Une passe par feuille, puis plus de pandas par ligne
     log("[PYTHON] Chargement Excel...")
-    df_indiv = pd.read_excel(FILE_INDIV_DELIB)
-    df_indiv['nicad'] = df_indiv['nicad'].apply(clean_id)
-    log(f"   ✓ {len(df_indiv)} Délibérations Individuelles")
-
-    df_coll = pd.read_excel(FILE_COLL_DELIB)
-    df_coll['nicad'] = df_coll['nicad'].apply(clean_id)
-    log(f"   ✓ {len(df_coll)} Délibérations Collectives")
-
-    df_coord_pi = pd.read_excel(FILE_COORD_PI)
-    df_coord_pi['nicad'] = df_coord_pi['nicad'].apply(clean_id)
-    log(f"   ✓ {len(df_coord_pi)} Coordonnées PI")
-
-    df_coord_pc = pd.read_excel(FILE_COORD_PC)
-    df_coord_pc['nicad'] = df_coord_pc['nicad'].apply(clean_id)
-    log(f"   ✓ {len(df_coord_pc)} Coordonnées PC")
-
-    # Diagnostic
-    nicads_delib = set(df_indiv['nicad'].unique())
-    nicads_coords = set(df_coord_pi['nicad'].unique())
-    matchs = nicads_delib & nicads_coords
-    log(f"   🔍 [DIAGNOSTIC] Correspondance PI: {len(matchs)} / {len(nicads_delib)}")
-
-    # Générer Individuels
-    log("\\n📄 Génération Individuelles...")
-    nb_gen = 0
-    for idx, row in df_indiv.iterrows():
-        nicad = row['nicad']
+    entetes_indiv, colonnes_indiv, partition_indiv = obtenir(
+        'indiv', f"PI|{CHAMPS_INDIV}|{partition}", lambda: _lire_enregistrements(
+            fichiers['indiv'], chargeur, _colonnes_indiv, partition, profilage))
+    enregs_indiv = _depuis_colonnes(colonnes_indiv)
+    log(f"   ✓ {len(enregs_indiv)} Délibérations Individuelles")
+
+    entetes_coll, colonnes_coll, partition_coll = obtenir(
+        'coll', f"PC|{CHAMPS_COLL}|{partition}", lambda: _lire_enregistrements(
+            fichiers['coll'], chargeur, _colonnes_coll, partition, profilage))
+    enregs_coll = _depuis_colonnes(colonnes_coll)
+    log(f"   ✓ {len(enregs_coll)} Délibérations Collectives")
+
+    beneficiaires = IndexBeneficiaires.depuis_enregistrements(enregs_coll)
+    log(f"   ✓ {beneficiaires.nb_beneficiaires} Bénéficiaires")
+    if beneficiaires.incoherents:
+        log(f"   ⚠️ {len(beneficiaires.incoherents)} parcelles collectives aux cellules Prenom / Nom / pièce "
+            f"de longueurs différentes (complétées par des vides)")
+
+    # Les feuilles de sommets, de loin les plus lourdes, sont lues en flux quel que soit le chargeur
+    index_pi = IndexCoordonnees(*obtenir('coord_pi', "COORDS", lambda: IndexCoordonnees.lire(
+        fichiers['coord_pi'], profilage=profilage).etat()))
+    log(f"   ✓ {index_pi.nb_sommets} Coordonnées PI")
+
+    index_pc = IndexCoordonnees(*obtenir('coord_pc', "COORDS", lambda: IndexCoordonnees.lire(
+        fichiers['coord_pc'], profilage=profilage).etat()))
+    log(f"   ✓ {index_pc.nb_sommets} Coordonnées PC")
+
+    donnees = {
+        'PI': enregs_indiv,
+        'PC': enregs_coll,
+        'index_pi': index_pi,
+        'index_pc': index_pc,
+        'beneficiaires': beneficiaires,
+        'entetes': {'indiv': entetes_indiv, 'coll': entetes_coll,
+                    'coord_pi': index_pi.colonnes, 'coord_pc': index_pc.colonnes},
+    }
+    if partition:
+        donnees['partitions'] = {'PI': _valeurs_partition(enregs_indiv, partition_indiv),
+                                 'PC': _valeurs_partition(enregs_coll, partition_coll)}
+    return donnees
+
+def nom_extrait(type_extrait, nicad):
+    """Chemin de l'extrait dans l'archive résultat"""
+    return f"{DOSSIERS[type_extrait]}/Extrait_{type_extrait}_{nicad}.docx"
+
+def nom_type(nom):
+    """Type d'extrait (PI / PC) d'après son chemin dans l'archive"""
+    return next(type_extrait for type_extrait, dossier in DOSSIERS.items() if nom.startswith(dossier + "/"))
+
+class Moteur:
+    """Modèles compilés et index de coordonnées : tout ce qu'il faut pour rendre un extrait"""
+
+    def __init__(self, modele_indiv, modele_coll, index_pi, index_pc, rendu=MOTEUR_RENDU, beneficiaires=None,
+                 profilage=None):
+        self.modele_indiv = modele_indiv
+        self.modele_coll = modele_coll
+        self.index_pi = index_pi
+        self.index_pc = index_pc
+        self.beneficiaires = beneficiaires or IndexBeneficiaires()
+        self._cles_indiv = [cle for cle, _ in CHAMPS_INDIV]
+        self._cles_coll = [cle for cle, _ in CHAMPS_COLL]
+        # Sous-étapes du rendu (coordonnées, tableaux, sauvegarde) chronométrées si profilage
+        self.profilage = profilage
+        # Rendu XML direct : extraits refusés par le gabarit (rendus par python-docx)
+        self.rendu = rendu
+        self.nb_replis = 0
+        self._gabarits = {}
+        if rendu == "xml":
+            self._gabarits = {'PI': modele_indiv.gabarit_xml(self._cles_indiv, ("coordonnees",)),
+                              'PC': modele_coll.gabarit_xml(self._cles_coll, ("beneficiaires", "coordonnees"))}
+
+    def rendre(self, type_extrait, enreg):
+        """Rend l'extrait d'un enregistrement ; retourne (nom dans l'archive, Document).
+
+        Le Document partage le paquet du modèle : il doit être sauvegardé avant
+        le rendu suivant.
+        """
+        if type_extrait == 'PI':
+            return nom_extrait(type_extrait, enreg[0]), self._rendre_individuel(enreg)
+        return nom_extrait(type_extrait, enreg[0]), self._rendre_collectif(enreg)
+
+    def rendre_octets(self, type_extrait, enreg):
+        gabarit = self._gabarits.get(type_extrait)
+        if gabarit is not None:
+            octets = self._rendre_xml(gabarit, type_extrait, enreg)
+            if octets is not None:
+                return nom_extrait(type_extrait, enreg[0]), octets
+            self.nb_replis += 1
+        nom, doc = self.rendre(type_extrait, enreg)
+        flux = io.BytesIO()
+        chronometrer(self.profilage, 'sauvegarde', doc.save, flux)
+        return nom, flux.getvalue()
+
+    def _points(self, nicad, index):
+        return chronometrer(self.profilage, 'recherche_coordonnees', obtenir_points, nicad, index)
+
+    def _rendre_xml(self, gabarit, type_extrait, enreg):
+        nicad = enreg[0]
+        if type_extrait == 'PI':
+            return gabarit.rendre(enreg[1:], {'coordonnees': self._points(nicad, self.index_pi)})
+        nb_champs = len(self._cles_coll)
+        return gabarit.rendre(enreg[1:1 + nb_champs], {
+            'beneficiaires': self.beneficiaires.obtenir(nicad, enreg[1 + nb_champs:]),
+            'coordonnees': self._points(nicad, self.index_pc),
+        })
+
+    def _rendre_individuel(self, enreg):
+        nicad = enreg[0]
+        modele = self.modele_indiv
+        doc = modele.instancier()
+
+        replacements = dict(zip(self._cles_indiv, enreg[1:]))
+
+        modele.remplir(replacements)
+        reduire_texte_legal(doc, modele.paragraphes_champs)
+
+        points = self._points(nicad, self.index_pi)
+        if doc.tables and points:
+            chronometrer(self.profilage, 'remplissage_tableaux', remplir_tableau_coordonnees, doc, 0, points)
+        return doc
+
+    def _rendre_collectif(self, enreg):
+        nicad = enreg[0]
+        modele = self.modele_coll
+        nb_champs = len(self._cles_coll)
+        doc = modele.instancier()
+
+        replacements = dict(zip(self._cles_coll, enreg[1:1 + nb_champs]))
+
+        modele.remplir(replacements)
+        reduire_texte_legal(doc, modele.paragraphes_champs)
+
+        benefs = self.beneficiaires.obtenir(nicad, enreg[1 + nb_champs:])
+        if len(doc.tables) >= 1:
+            chronometrer(self.profilage, 'remplissage_tableaux', remplir_tableau_beneficiaires, doc.tables[0], benefs)
+
+        points = self._points(nicad, self.index_pc)
+        if len(doc.tables) >= 2:
+            chronometrer(self.profilage, 'remplissage_tableaux', remplir_tableau_coordonnees, doc, 1, points)
+        return doc
+
+def planifier(donnees, manifeste):
+    """(tâches [(type, enreg, empreinte, octets)] dans l'ordre des feuilles, doublons [(type, nicad)]).
+
+    `octets` contient l'extrait précédent quand ses entrées n'ont pas changé,
+    None quand il faut le rendre. Un NICAD déjà planifié pour son type n'est pas
+    repris : seule sa première ligne donne un extrait (un nom par entrée d'archive).
+    """
+    taches, doublons = [], []
+    for type_extrait, index in (('PI', donnees['index_pi']), ('PC', donnees['index_pc'])):
+        vus = set()
+        for enreg in donnees[type_extrait]:
+            if enreg[0] in vus:
+                doublons.append((type_extrait, enreg[0]))
+                continue
+            vus.add(enreg[0])
+            empreinte = manifeste.empreinte(type_extrait, enreg, index.points(enreg[0]))
+            octets = manifeste.reprendre(nom_extrait(type_extrait, enreg[0]), empreinte)
+            taches.append((type_extrait, enreg, empreinte, octets))
+    return taches, doublons
+
+def publier(sortie, manifeste, fusions, type_extrait, enreg, empreinte, octets=None, doc=None, profilage=None):
+    """Écrit un extrait (Document rendu ou octets) dans l'archive, le manifeste et le document fusionné.
+
+    Avec `profilage` : sous-étapes sauvegarde (Document sérialisé dans son entrée ZIP),
+    zip (octets déjà sérialisés) et ajout_fusion.
+    """
+    nom = nom_extrait(type_extrait, enreg[0])
+    if doc is not None:
+        chronometrer(profilage, 'sauvegarde', sortie.ajouter_document, nom, doc)
+    else:
+        chronometrer(profilage, 'zip', sortie.ajouter, nom, octets)
+    manifeste.enregistrer(nom, enreg[0], type_extrait, empreinte)
+    if fusions:
+        if doc is not None:
+            chronometrer(profilage, 'ajout_fusion', fusions[type_extrait].ajouter, doc)
+        else:
+            chronometrer(profilage, 'ajout_fusion', fusions[type_extrait].ajouter_octets, octets)
+
+def executer(pas):
+    """Déroule un générateur d'étapes jusqu'au bout ; retourne sa valeur de retour"""
+    while True:
         try:
-            doc = Document(TEMPLATE_INDIV)
-            nettoyer_connexions_donnees(doc)
-            optimiser_mise_en_page(doc)
-            
-            replacements = {
-                '«Prenom»': row.get('Prenom', ''), '«Nom»': row.get('Nom', ''),
-                '«nicad»': nicad, '«superficie»': row.get('superficie', ''),
-                '«Village»': row.get('Village', ''), '«type_usag»': row.get('type_usag', ''),
-                '«Num_piece»': row.get('Num_piece', ''), '«Type_piece»': row.get('Type_piece', ''),
-                '«Date_naissance»': row.get('Date_naissance', ''), '«Telephone»': row.get('Telephone', '')
-            }
-            
-            remplacer_texte(doc, replacements)
-            optimiser_espacement(doc)
-            reduire_texte_legal(doc)
-            
-            points = obtenir_points(nicad, df_coord_pi)
-            if doc.tables and points:
-                remplir_tableau_coordonnees(doc, 0, points)
-            
-            output_path = os.path.join(output_indiv_dir, f"Extrait_PI_{nicad}.docx")
-            doc.save(output_path)
-            nb_gen += 1
-            if nb_gen % 50 == 0:
-                log(f"   ... {nb_gen} générés")
+            next(pas)
+        except StopIteration as fin:
+            return fin.value
+
+def pas_sequentiels(moteur, taches, sortie, manifeste, fusions=None, progression=None, profilage=None):
+    """Rend les extraits un par un dans le processus courant (navigateur) ;
+    rend la main (yield) après chaque parcelle"""
+    progression = progression or Progression()
+    nb_gen = {'PI': 0, 'PC': 0}
+    for type_extrait, enreg, empreinte, octets in taches:
+        nicad = enreg[0]
+        try:
+            if octets is not None:
+                publier(sortie, manifeste, fusions, type_extrait, enreg, empreinte, octets=octets, profilage=profilage)
+                progression.avancer(type_extrait)
+            else:
+                debut = time.perf_counter()
+                if moteur.rendu == "xml":
+                    _, octets = moteur.rendre_octets(type_extrait, enreg)
+                    publier(sortie, manifeste, fusions, type_extrait, enreg, empreinte, octets=octets,
+                            profilage=profilage)
+                else:
+                    _, doc = moteur.rendre(type_extrait, enreg)
+                    publier(sortie, manifeste, fusions, type_extrait, enreg, empreinte, doc=doc, profilage=profilage)
+                if profilage is not None:
+                    profilage.parcelle(type_extrait, nicad, time.perf_counter() - debut)
+                nb_gen[type_extrait] += 1
+                progression.avancer(type_extrait)
+                if type_extrait == 'PI' and nb_gen['PI'] % 50 == 0:
+                    log(f"   ... {nb_gen['PI']} générés")
         except Exception as e:
             log(f"   ❌ Erreur {nicad}: {str(e)}")
-    log(f"   ✓ {nb_gen} Extraits Individuels générés.")
+            progression.erreur(nicad, str(e))
+        yield
+    return nb_gen
+
+# === MODE NATIF MULTI-PROCESSUS ===
+_MOTEUR_TRAVAILLEUR = None
 
-    # Générer Collectifs
-    log("\\n📄 Génération Collectives...")
-    nb_gen_coll = 0
-    for idx, row in df_coll.iterrows():
-        nicad = row['nicad']
+def _initialiser_travailleur(tpl_indiv, tpl_coll, index_pi, index_pc, rendu=MOTEUR_RENDU, beneficiaires=None):
+    """Chaque processus compile ses modèles une fois et garde les index reçus du parent"""
+    global _MOTEUR_TRAVAILLEUR
+    _MOTEUR_TRAVAILLEUR = Moteur(ModeleCompile(tpl_indiv), ModeleCompile(tpl_coll), index_pi, index_pc, rendu,
+                                 beneficiaires)
+
+def _rendre_lot(taches):
+    """Rend un lot [(type, enreg)] dans un processus de travail ; retourne [(octets, erreur, durée)]"""
+    resultats = []
+    for type_extrait, enreg in taches:
+        debut = time.perf_counter()
         try:
-            doc = Document(TEMPLATE_COLL)
-            nettoyer_connexions_donnees(doc)
-            optimiser_mise_en_page(doc)
-            
-            replacements = {
-                '«nicad»': nicad, '«superficie»': row.get('superficie', ''),
-                '«Village»': row.get('Village', ''), '«type_usa»': row.get('type_usa', ''),
-                '«Num_piece»': row.get('Numero_piece', '')
-            }
-            
-            remplacer_texte(doc, replacements)
-            optimiser_espacement(doc)
-            reduire_texte_legal(doc)
-            
-            benefs = parser_beneficiaires(row)
-            if len(doc.tables) >= 1:
-                remplir_tableau_beneficiaires(doc.tables[0], benefs)
-            
-            points = obtenir_points(nicad, df_coord_pc)
-            if len(doc.tables) >= 2:
-                remplir_tableau_coordonnees(doc, 1, points)
-            
-            output_path = os.path.join(output_coll_dir, f"Extrait_PC_{nicad}.docx")
-            doc.save(output_path)
-            nb_gen_coll += 1
+            _, octets = _MOTEUR_TRAVAILLEUR.rendre_octets(type_extrait, enreg)
+            resultats.append((octets, None, time.perf_counter() - debut))
         except Exception as e:
-            log(f"   ❌ Erreur {nicad}: {str(e)}")
-    log(f"   ✓ {nb_gen_coll} Extraits Collectifs générés.")
+            resultats.append((None, str(e), time.perf_counter() - debut))
+    return resultats
+
+def _rendus_bornes(pool, lots, fenetre):
+    """Résultats des lots dans l'ordre, avec au plus `fenetre` lots soumis et non consommés :
+    la mémoire du parent reste bornée même si les processus rendent plus vite qu'il n'écrit"""
+    lots = iter(lots)
+    en_vol = collections.deque(pool.submit(_rendre_lot, lot) for lot in islice(lots, fenetre))
+    while en_vol:
+        resultats = en_vol.popleft().result()
+        lot = next(lots, None)
+        if lot is not None:
+            en_vol.append(pool.submit(_rendre_lot, lot))
+        yield from resultats
+
+def pas_paralleles(fichiers, donnees, taches, sortie, manifeste, processus, taille_lot=TAILLE_LOT, fusions=None,
+                   progression=None, rendu=MOTEUR_RENDU, profilage=None):
+    """Répartit les extraits à rendre par lots sur un pool de processus ; le parent écrit l'archive
+    et rend la main (yield) après chaque extrait publié"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    progression = progression or Progression()
+    a_rendre = [(type_extrait, enreg) for type_extrait, enreg, _, octets in taches if octets is None]
+    lots = [a_rendre[debut:debut + taille_lot] for debut in range(0, len(a_rendre), taille_lot)]
+    nb_gen = {'PI': 0, 'PC': 0}
+    initargs = (fichiers['tpl_indiv'], fichiers['tpl_coll'], donnees['index_pi'], donnees['index_pc'], rendu,
+                donnees['beneficiaires'])
+    with ProcessPoolExecutor(max_workers=processus, initializer=_initialiser_travailleur,
+                             initargs=initargs) as pool:
+        # Les résultats arrivent dans l'ordre des lots : on les réinsère à leur place
+        rendus = _rendus_bornes(pool, lots, LOTS_PAR_PROCESSUS * processus)
+        for type_extrait, enreg, empreinte, octets in taches:
+            if octets is None:
+                octets, erreur, duree = next(rendus)
+                if erreur is not None:
+                    log(f"   ❌ Erreur {enreg[0]}: {erreur}")
+                    progression.erreur(enreg[0], erreur)
+                    yield
+                    continue
+                if profilage is not None:
+                    profilage.parcelle(type_extrait, enreg[0], duree)
+                nb_gen[type_extrait] += 1
+                if (nb_gen['PI'] + nb_gen['PC']) % taille_lot == 0:
+                    log(f"   ... {nb_gen['PI']} PI / {nb_gen['PC']} PC générés")
+            publier(sortie, manifeste, fusions, type_extrait, enreg, empreinte, octets=octets, profilage=profilage)
+            progression.avancer(type_extrait)
+            yield
+    return nb_gen
+
+def generer_extraits(fichiers, dossier_sortie, processus=1, taille_lot=TAILLE_LOT, compression=COMPRESSION_ZIP,
+                     chargeur=CHARGEUR, fusionner=FUSIONNER, progression=None, cache=None, partition=None,
+                     taille_max_archive=None, tolerance_superficie=TOLERANCE_SUPERFICIE,
+                     arret_sur_anomalie=ARRET_SUR_ANOMALIE, rendu=MOTEUR_RENDU, profilage=None, modeles=None):
+    """Génération complète : chargement, diagnostic, rendu, archive ZIP, documents fusionnés et manifeste.
+
+    `progression` (Progression) reçoit les événements structurés des étapes et du rendu ;
+    `cache` (CacheEntrees) évite de réanalyser les classeurs déjà vus. Avec `partition`
+    (colonne, ex. "Village") et/ou `taille_max_archive` (octets), une archive est produite
+    par partition : la valeur retournée est alors la liste des archives.
+    `tolerance_superficie` règle le contrôle géométrique (None pour le désactiver) ;
+    avec `arret_sur_anomalie`, une anomalie bloquante du contrôle préalable lève
+    ValueError avant tout rendu. `rendu` choisit le moteur de rendu ("docx" ou "xml") ;
+    avec `profilage` (Profilage), le rapport de profilage est joint à l'archive. Avec
+    `modeles` (ModelesCompiles), un modèle déjà compilé dans la session est réutilisé.
+    """
+    return executer(etapes_generation(fichiers, dossier_sortie, processus, taille_lot, compression, chargeur,
+                                      fusionner, progression, cache, partition, taille_max_archive,
+                                      tolerance_superficie, arret_sur_anomalie, rendu, profilage, modeles))
+
+def etapes_generation(fichiers, dossier_sortie, processus=1, taille_lot=TAILLE_LOT, compression=COMPRESSION_ZIP,
+                      chargeur=CHARGEUR, fusionner=FUSIONNER, progression=None, cache=None, partition=None,
+                      taille_max_archive=None, tolerance_superficie=TOLERANCE_SUPERFICIE,
+                      arret_sur_anomalie=ARRET_SUR_ANOMALIE, rendu=MOTEUR_RENDU, profilage=None, modeles=None):
+    """generer_extraits découpé en pas : rend la main (yield) entre les étapes et après chaque parcelle.
+
+    Si le générateur est fermé ou qu'une erreur survient avant la fin, l'archive
+    partielle est supprimée et l'archive existante n'est pas touchée.
+    """
+    progression = progression or Progression()
+    os.makedirs(dossier_sortie, exist_ok=True)
+    chemin_zip = os.path.join(dossier_sortie, NOM_ZIP_RESULTAT)
+
+    with progression.etape('chargement'):
+        donnees = charger_donnees(fichiers, chargeur, cache, partition, profilage)
+    yield
+
+    # Rapports JSON joints à l'archive (à chaque archive si partitionné) et écrits à côté
+    rapports = {}
+    with progression.etape('controle'):
+        controle = controler_entrees(fichiers, donnees)
+    progression.emettre('controle', bloquantes=controle['bloquantes'], **controle['anomalies'])
+    rapports[NOM_RAPPORT_CONTROLE] = json.dumps(controle, ensure_ascii=False, indent=1).encode('utf-8')
+    if arret_sur_anomalie and controle['bloquantes']:
+        chemin_rapport = os.path.join(dossier_sortie, NOM_RAPPORT_CONTROLE)
+        with open(chemin_rapport, 'wb') as f:
+            f.write(rapports[NOM_RAPPORT_CONTROLE])
+        raise ValueError(f"Données rejetées : {controle['bloquantes']} anomalies bloquantes (détail : {chemin_rapport})")
+
+    if tolerance_superficie is not None:
+        with progression.etape('geometrie'):
+            rapport_geometrie = controler_geometrie(donnees, tolerance_superficie)
+        if rapport_geometrie is not None:
+            progression.emettre('geometrie', signalees=len(rapport_geometrie['parcelles_signalees']),
+                                **rapport_geometrie['anomalies'])
+            rapports[NOM_RAPPORT_GEOMETRIE] = json.dumps(rapport_geometrie, ensure_ascii=False,
+                                                         indent=1).encode('utf-8')
+
+    # L'archive est écrite à côté puis mise en place à la fin : l'archive précédente
+    # (éventuellement au même chemin) reste lisible et intacte jusqu'au bout
+    zip_precedent = fichiers.get('zip_precedent')
+    chemin_partiel = chemin_zip + ".partiel"
+
+    with progression.etape('planification'):
+        empreintes_modeles = {'PI': empreinte_fichier(fichiers['tpl_indiv']),
+                              'PC': empreinte_fichier(fichiers['tpl_coll'])}
+        manifeste = Manifeste(empreintes_modeles, zip_precedent)
+        taches, doublons = planifier(donnees, manifeste)
+        if doublons:
+            log(f"   ⚠️ {len(doublons)} lignes au NICAD déjà vu ignorées (première ligne seule extraite)")
+    partitionne = bool(partition or taille_max_archive)
+    if partitionne:
+        # Tâches regroupées par partition (tri stable : ordre des feuilles dans chaque partition)
+        partitions = cles_partition(taches, partition, donnees) if partition else {}
+        taches.sort(key=lambda t: partitions.get(nom_extrait(t[0], t[1][0]), ""))
+    yield
+    nb_reprises = sum(1 for t in taches if t[3] is not None)
+    nb_a_rendre = {type_extrait: sum(1 for t in taches if t[0] == type_extrait and t[3] is None)
+                   for type_extrait in ('PI', 'PC')}
+
+    moteur = fusions = None
+    try:
+        with progression.etape('modeles'):
+            if processus == 1 or fusionner:
+                log("[PYTHON] Préparation des modèles...")
+                compiler = modeles.obtenir if modeles is not None else ModeleCompile
+                moteur = Moteur(compiler(fichiers['tpl_indiv']), compiler(fichiers['tpl_coll']),
+                                donnees['index_pi'], donnees['index_pc'], rendu, donnees['beneficiaires'], profilage)
+            if fusionner and partitionne:
+                modeles_fusion = {'PI': moteur.modele_indiv, 'PC': moteur.modele_coll}
+                for modele in modeles_fusion.values():
+                    modele.paquet()
+            elif fusionner:
+                fusions = {'PI': DocumentFusionne(moteur.modele_indiv), 'PC': DocumentFusionne(moteur.modele_coll)}
+
+        # Les extraits sont écrits au fil de l'eau dans l'archive résultat (ou l'archive de leur partition)
+        if partitionne:
+            contexte_sortie = SortiePartitionnee(dossier_sortie, partitions, compression, taille_max_archive,
+                                                 modeles_fusion if fusionner else None, manifeste, progression,
+                                                 rapports)
+        else:
+            contexte_sortie = SortieZip(chemin_partiel, compression)
+        with contexte_sortie as sortie:
+            if nb_reprises:
+                log(f"\n♻️ {nb_reprises} extraits inchangés repris de l'archive précédente")
+
+            progression.demarrer(len(taches) + len(doublons))
+            for type_extrait, nicad in doublons:
+                progression.erreur(nicad, f"NICAD {type_extrait} en double : ligne ignorée")
+            if profilage is not None:
+                profilage.processus = processus
+            with progression.etape('rendu'), profilage.rendu() if profilage else contextlib.nullcontext():
+                if processus > 1:
+                    log(f"\n📄 Génération sur {processus} processus ({nb_a_rendre['PI']} PI, {nb_a_rendre['PC']} PC)...")
+                    nb_gen = yield from pas_paralleles(fichiers, donnees, taches, sortie, manifeste, processus,
+                                                       taille_lot, fusions, progression, rendu, profilage)
+                    log(f"   ✓ {nb_gen['PI']} Extraits Individuels générés.")
+                    log(f"   ✓ {nb_gen['PC']} Extraits Collectifs générés.")
+                elif partitionne:
+                    log(f"\n📄 Génération par archive ({nb_a_rendre['PI']} PI, {nb_a_rendre['PC']} PC)...")
+                    nb_gen = yield from pas_sequentiels(moteur, taches, sortie, manifeste, None, progression, profilage)
+                    log(f"   ✓ {nb_gen['PI']} Extraits Individuels générés.")
+                    log(f"   ✓ {nb_gen['PC']} Extraits Collectifs générés.")
+                else:
+                    log("\\n📄 Génération Individuelles...")
+                    nb_gen = yield from pas_sequentiels(moteur, [t for t in taches if t[0] == 'PI'], sortie,
+                                                       manifeste, fusions, progression, profilage)
+                    log(f"   ✓ {nb_gen['PI']} Extraits Individuels générés.")
+
+                    log("\\n📄 Génération Collectives...")
+                    nb_gen = yield from pas_sequentiels(moteur, [t for t in taches if t[0] == 'PC'], sortie,
+                                                       manifeste, fusions, progression, profilage)
+                    log(f"   ✓ {nb_gen['PC']} Extraits Collectifs générés.")
+
+            if fusions:
+                with progression.etape('fusion'):
+                    log("\n🔗 Documents fusionnés...")
+                    for type_extrait, fusion in fusions.items():
+                        if fusion.nb_extraits:
+                            with sortie.ouvrir_annexe(NOMS_FUSION[type_extrait]) as flux:
+                                fusion.ecrire(flux)
+                            log(f"   ✓ {NOMS_FUSION[type_extrait]} ({fusion.nb_extraits} extraits)")
+                        fusion.fermer()
+
+            if profilage is not None:
+                rapports.update(profilage.rapports(progression, donnees))
+            contenu_manifeste = manifeste.vers_json()
+            if not partitionne:
+                sortie.ajouter_annexe(NOM_MANIFESTE, contenu_manifeste)
+                for nom, contenu in rapports.items():
+                    sortie.ajouter_annexe(nom, contenu)
+    except BaseException:
+        # Génération interrompue (erreur, annulation) : pas d'archive partielle
+        manifeste.fermer()
+        for fusion in (fusions or {}).values():
+            fusion.fermer()
+        if os.path.exists(chemin_partiel):
+            os.remove(chemin_partiel)
+        raise
+    manifeste.fermer()
+    if not partitionne:
+        os.replace(chemin_partiel, chemin_zip)
+
+    with open(os.path.join(dossier_sortie, NOM_MANIFESTE), 'wb') as f:
+        f.write(contenu_manifeste)
+    for nom, contenu in rapports.items():
+        with open(os.path.join(dossier_sortie, nom), 'wb') as f:
+            f.write(contenu)
+    if manifeste.actif:
+        log(f"   ♻️ Incrémental : {len(manifeste.ajoutes)} ajoutés, {len(manifeste.modifies)} modifiés, "
+            f"{len(manifeste.supprimes())} supprimés, {len(manifeste.reutilises)} réutilisés")
 
-    # ZIP
-    log("\\n📦 Création du fichier ZIP...")
-    shutil.make_archive("/output/Resultats_Extraits", 'zip', OUTPUT_DIR)
-    log("✅ ZIP créé : /output/Resultats_Extraits.zip")
+    if partitionne:
+        log(f"✅ {len(sortie.archives)} archives créées dans {dossier_sortie} ({sortie.nb_fichiers} extraits)")
+        progression.terminer(archives=sortie.archives, extraits=sortie.nb_fichiers, repris=nb_reprises)
+        return sortie.archives
+    log(f"✅ ZIP créé : {chemin_zip} ({sortie.nb_fichiers} extraits)")
+    progression.terminer(zip=chemin_zip, extraits=sortie.nb_fichiers, repris=nb_reprises)
+    return chemin_zip
+
+# === API GÉNÉRATEUR ===
+def iter_extraits(fichiers=None, chargeur=CHARGEUR, cache=None, progression=None, types=('PI', 'PC'),
+                  rendu=MOTEUR_RENDU):
+    """Extraits rendus un par un : génère des (nicad, type, octets du .docx).
+
+    Rien n'est écrit sous /output et rien n'est retenu une fois un extrait consommé :
+    la mémoire reste celle des données d'entrée et des modèles compilés, quelle que
+    soit la taille de la commune. Le chargement a lieu au premier next(). Une parcelle
+    en erreur est journalisée et sautée ; un NICAD déjà produit pour son type aussi
+    (première ligne seule, comme dans l'archive).
+    """
+    fichiers = fichiers or fichiers_entree(INPUT_DIR)
+    progression = progression or Progression()
+    with progression.etape('chargement'):
+        donnees = charger_donnees(fichiers, chargeur, cache)
+    with progression.etape('modeles'):
+        moteur = Moteur(ModeleCompile(fichiers['tpl_indiv']), ModeleCompile(fichiers['tpl_coll']),
+                        donnees['index_pi'], donnees['index_pc'], rendu, donnees['beneficiaires'])
+
+    progression.demarrer(sum(len(donnees[type_extrait]) for type_extrait in types))
+    for type_extrait in types:
+        vus = set()
+        for enreg in donnees[type_extrait]:
+            if enreg[0] in vus:
+                progression.erreur(enreg[0], f"NICAD {type_extrait} en double : ligne ignorée")
+                continue
+            vus.add(enreg[0])
+            try:
+                _, octets = moteur.rendre_octets(type_extrait, enreg)
+            except Exception as e:
+                log(f"   ❌ Erreur {enreg[0]}: {str(e)}")
+                progression.erreur(enreg[0], str(e))
+                continue
+            progression.avancer(type_extrait)
+            yield enreg[0], type_extrait, octets
+    progression.terminer()
+
+# === EXTRAITS À LA DEMANDE ===
+class GuichetExtraits:
+    """Réimpression à la demande : entrées chargées, index NICAD et modèles préparés une
+    fois, puis rendu d'une parcelle, d'une liste ou d'un village sans repasser par la
+    commune entière. Les `taille_cache` derniers extraits rendus sont gardés (LRU) :
+    réimprimer un extrait récent ne coûte qu'une recherche.
+    """
+
+    def __init__(self, fichiers=None, chargeur=CHARGEUR, cache=None, rendu=MOTEUR_RENDU,
+                 taille_cache=TAILLE_CACHE_EXTRAITS, modeles=None):
+        fichiers = fichiers or fichiers_entree(INPUT_DIR)
+        self.donnees = donnees = charger_donnees(fichiers, chargeur, cache)
+        compiler = modeles.obtenir if modeles is not None else ModeleCompile
+        self.moteur = Moteur(compiler(fichiers['tpl_indiv']), compiler(fichiers['tpl_coll']),
+                             donnees['index_pi'], donnees['index_pc'], rendu, donnees['beneficiaires'])
+        self.taille_cache = taille_cache
+        self.succes = 0
+        self.rendus = 0
+        self._recents = collections.OrderedDict()
+
+        # NICAD → enregistrement (première ligne en cas de doublon) et village → NICAD, par type
+        self._enregs = {type_extrait: {} for type_extrait in ('PI', 'PC')}
+        self._villages = {}
+        for type_extrait, champs in (('PI', CHAMPS_INDIV), ('PC', CHAMPS_COLL)):
+            i_village = 1 + [col for _, col in champs].index('Village')
+            for enreg in donnees[type_extrait]:
+                if enreg[0] in self._enregs[type_extrait]:
+                    continue
+                self._enregs[type_extrait][enreg[0]] = enreg
+                self._villages.setdefault(self._cle_village(enreg[i_village]), []).append((type_extrait, enreg[0]))
+        log(f"   🪟 Guichet prêt : {len(self._enregs['PI'])} PI, {len(self._enregs['PC'])} PC, "
+            f"{len(self._villages)} villages")
+
+    @staticmethod
+    def _cle_village(village):
+        return " ".join(village.split()).casefold()
+
+    def types(self, nicad):
+        """Types d'extrait (PI, PC) disponibles pour ce NICAD"""
+        return tuple(type_extrait for type_extrait, enregs in self._enregs.items() if nicad in enregs)
+
+    def selection(self, nicads=(), village=None, types=('PI', 'PC')):
+        """[(type, nicad)] des parcelles demandées : NICAD listés puis parcelles du village"""
+        choisies = []
+        for nicad in nicads:
+            nicad = clean_id(nicad)
+            trouves = [type_extrait for type_extrait in self.types(nicad) if type_extrait in types]
+            if not trouves:
+                raise ValueError(f"NICAD inconnu : {nicad}")
+            choisies.extend((type_extrait, nicad) for type_extrait in trouves)
+        if village is not None:
+            parcelles = self._villages.get(self._cle_village(village))
+            if parcelles is None:
+                raise ValueError(f"Village inconnu : {village}")
+            choisies.extend(parcelle for parcelle in parcelles if parcelle[0] in types)
+        return list(dict.fromkeys(choisies))
+
+    def extrait(self, nicad, type_extrait=None):
+        """(nom dans l'archive, octets du .docx) d'une parcelle ; type deviné si un seul existe"""
+        nicad = clean_id(nicad)
+        if type_extrait is None:
+            types = self.types(nicad)
+            if len(types) != 1:
+                raise ValueError(f"NICAD inconnu : {nicad}" if not types
+                                 else f"NICAD {nicad} individuel et collectif : préciser le type")
+            type_extrait = types[0]
+        nom = nom_extrait(type_extrait, nicad)
+        octets = self._recents.get(nom)
+        if octets is not None:
+            self._recents.move_to_end(nom)
+            self.succes += 1
+            return nom, octets
+
+        enreg = self._enregs[type_extrait].get(nicad)
+        if enreg is None:
+            raise ValueError(f"NICAD inconnu : {nicad} ({type_extrait})")
+        _, octets = self.moteur.rendre_octets(type_extrait, enreg)
+        self.rendus += 1
+        if self.taille_cache:
+            self._recents[nom] = octets
+            if len(self._recents) > self.taille_cache:
+                self._recents.popitem(last=False)
+        return nom, octets
+
+    def extraits(self, nicads=(), village=None, types=('PI', 'PC')):
+        """[(nom, octets)] : un .docx par parcelle demandée"""
+        return [self.extrait(nicad, type_extrait) for type_extrait, nicad in self.selection(nicads, village, types)]
+
+    def reunis(self, nicads=(), village=None, types=('PI', 'PC')):
+        """{nom du document: octets} : les parcelles demandées réunies dans un .docx par type"""
+        parcelles = self.selection(nicads, village, types)
+        documents = {}
+        for type_extrait in ('PI', 'PC'):
+            nicads_type = [nicad for t, nicad in parcelles if t == type_extrait]
+            if not nicads_type:
+                continue
+            # Paquet du modèle calculé avant tout rendu (DocumentFusionne) ; les extraits arrivent en octets
+            fusion = DocumentFusionne(self.moteur.modele_indiv if type_extrait == 'PI' else self.moteur.modele_coll)
+            try:
+                for nicad in nicads_type:
+                    fusion.ajouter_octets(self.extrait(nicad, type_extrait)[1])
+                flux = io.BytesIO()
+                fusion.ecrire(flux)
+            finally:
+                fusion.fermer()
+            documents[NOMS_FUSION[type_extrait]] = flux.getvalue()
+        return documents
+
+# === API ASYNCHRONE ===
+class Controle:
+    """Pause, reprise et annulation d'une génération asynchrone, pilotables depuis l'UI"""
+
+    def __init__(self):
+        self._actif = asyncio.Event()
+        self._actif.set()
+        self.annule = False
+
+    @property
+    def en_pause(self):
+        return not self._actif.is_set()
+
+    def pause(self):
+        self._actif.clear()
+
+    def reprendre(self):
+        self._actif.set()
+
+    def annuler(self):
+        self.annule = True
+        self._actif.set()
+
+    async def point_de_passage(self):
+        """Rend la main à la boucle d'événements, attend pendant une pause, lève si annulé"""
+        await asyncio.sleep(0)
+        await self._actif.wait()
+        if self.annule:
+            raise asyncio.CancelledError("Génération annulée")
+
+async def generer_extraits_async(fichiers, dossier_sortie, taille_tranche=TAILLE_TRANCHE, controle=None, **options):
+    """generer_extraits coopératif : rend la main tous les `taille_tranche` pas (WebLoop de Pyodide).
+
+    `options` : mêmes paramètres que generer_extraits. L'annulation passe par
+    `controle.annuler()` ou par tâche.cancel() ; dans les deux cas l'archive partielle
+    est supprimée et CancelledError propagée.
+    """
+    return await derouler(etapes_generation(fichiers, dossier_sortie, **options), taille_tranche, controle)
+
+async def derouler(pas, taille_tranche=TAILLE_TRANCHE, controle=None):
+    """Exécute un générateur de pas en rendant la main tous les `taille_tranche` pas ; retourne sa valeur"""
+    controle = controle or Controle()
+    try:
+        nb_pas = 0
+        while True:
+            try:
+                next(pas)
+            except StopIteration as fin:
+                return fin.value
+            nb_pas += 1
+            if nb_pas % taille_tranche == 0 or controle.en_pause or controle.annule:
+                await controle.point_de_passage()
+    finally:
+        pas.close()
+
+# === TRAVAUX PAR LOTS ===
+class FileTravaux:
+    """Communes traitées l'une après l'autre dans la même session (interpréteur, modules,
+    modèles compilés et cache des classeurs gardés au chaud) : une archive par travail.
+
+    `options` : paramètres de generer_extraits communs à tous les travaux. Avec
+    `profilage`, chaque archive reçoit son propre rapport de profilage. Un travail en
+    échec est journalisé et consigné dans son résultat, la file continue.
+    """
+
+    def __init__(self, progression=None, cache=None, profilage=None, **options):
+        self.progression = progression
+        self.cache = cache
+        self.profilage = profilage
+        self.options = options
+        self.modeles = ModelesCompiles()
+        self.resultats = []
+        self._file = collections.deque()
+
+    def ajouter(self, entree, sortie, nom=None, **parametres):
+        """Ajoute un travail : dossier d'entrée et de sortie, plus, au choix, des chemins
+        explicites (clés de NOMS_FICHIERS, ex. tpl_indiv) et des options propres au travail"""
+        chemins = {cle: parametres.pop(cle) for cle in list(parametres)
+                   if cle in NOMS_FICHIERS or cle in NOMS_FICHIERS_OPTIONNELS}
+        self._file.append({'nom': nom or os.path.basename(os.path.normpath(entree)),
+                           'fichiers': fichiers_entree(entree, **chemins), 'sortie': sortie, 'options': parametres})
+
+    def __len__(self):
+        return len(self._file)
+
+    def _progression(self, nom):
+        """Progression propre au travail ; ses événements portent le nom du travail"""
+        if self.progression is None or self.progression.rappel is None:
+            return None
+        rappel = self.progression.rappel
+        return Progression(lambda evenement: rappel({**evenement, 'travail': nom}), self.progression.cadence)
+
+    def etapes(self):
+        """Pas de tous les travaux en attente ; retourne leurs résultats"""
+        resultats = []
+        total = len(self._file)
+        while self._file:
+            travail = self._file.popleft()
+            nom = travail['nom']
+            log(f"\n🗂️ Travail {len(resultats) + 1}/{total} : {nom}")
+            resultat = {'nom': nom, 'sortie': travail['sortie'], 'archive': None, 'erreur': None}
+            debut = time.perf_counter()
+            try:
+                resultat['archive'] = yield from etapes_generation(
+                    travail['fichiers'], travail['sortie'], progression=self._progression(nom), cache=self.cache,
+                    modeles=self.modeles, profilage=self.profilage and self.profilage.copie(),
+                    **{**self.options, **travail['options']})
+            except Exception as e:
+                log(f"   ❌ Travail {nom} : {e}")
+                resultat['erreur'] = str(e)
+            resultat['duree_s'] = round(time.perf_counter() - debut, 3)
+            resultats.append(resultat)
+            self.resultats.append(resultat)
+            yield
+
+        nb_echecs = sum(1 for resultat in resultats if resultat['erreur'])
+        log(f"\n✅ {len(resultats) - nb_echecs}/{len(resultats)} travaux terminés, "
+            f"{len(self.modeles)} modèles compilés ({self.modeles.succes} réutilisations)")
+        return resultats
+
+    def executer(self):
+        return executer(self.etapes())
+
+    async def executer_async(self, taille_tranche=TAILLE_TRANCHE, controle=None):
+        return await derouler(self.etapes(), taille_tranche, controle)
+
+def lire_travaux(flux):
+    """Travaux décrits en JSON : [{"entree": ..., "sortie": ..., "nom"?, "tpl_indiv"?, options...}]"""
+    travaux = json.load(flux)
+    if not isinstance(travaux, list) or not all(isinstance(t, dict) and 'entree' in t and 'sortie' in t
+                                                for t in travaux):
+        raise ValueError("liste de travaux attendue, chacun avec 'entree' et 'sortie'")
+    return travaux
+
+# === MAIN ===
+def contexte_pyodide():
+    """(progression, cache) configurés depuis les globales posées par l'hôte JS.
+
+    `rappel_progression` (facultatif) reçoit chaque événement sous forme de chaîne JSON
+    (pas de proxy Python à libérer côté JS) ; le cache n'est utilisé que si un
+    système de fichiers persistant est monté sur DOSSIER_CACHE.
+    """
+    rappel_js = globals().get('rappel_progression')
+    progression = None
+    if rappel_js is not None:
+        progression = Progression(lambda evenement: rappel_js(json.dumps(evenement, ensure_ascii=False)),
+                                  globals().get('cadence_progression', CADENCE_PROGRESSION))
+    cache = CacheEntrees() if os.path.isdir(DOSSIER_CACHE) else None
+    return progression, cache
+
+def profilage_pyodide():
+    """Profilage demandé par l'hôte JS avec la globale `profil` : vraie pour les durées et
+    la mémoire, "cprofile", "tracemalloc" ou "complet" pour y ajouter ces mesures"""
+    profil = globals().get('profil')
+    if not profil:
+        return None
+    return Profilage(cprofile=profil in ("cprofile", "complet"), memoire=profil in ("tracemalloc", "complet"))
+
+_FILE_TRAVAUX = None
+
+def file_travaux():
+    """FileTravaux de la session Pyodide, créée au premier appel puis gardée avec ses modèles compilés"""
+    global _FILE_TRAVAUX
+    if _FILE_TRAVAUX is None:
+        progression, cache = contexte_pyodide()
+        _FILE_TRAVAUX = FileTravaux(progression, cache, profilage_pyodide(),
+                                    arret_sur_anomalie=globals().get('arret_sur_anomalie', ARRET_SUR_ANOMALIE),
+                                    rendu=globals().get('moteur_rendu', MOTEUR_RENDU))
+    return _FILE_TRAVAUX
+
+async def main_travaux(travaux, controle=None):
+    """Enchaîne les travaux décrits en JSON par l'hôte (mode_api) ; résultats en JSON.
+
+    À rappeler pour chaque nouvelle série : la session reste chaude d'un appel à l'autre.
+    """
+    file = file_travaux()
+    for travail in lire_travaux(io.StringIO(travaux)):
+        file.ajouter(**travail)
+    resultats = await file.executer_async(globals().get('taille_tranche', TAILLE_TRANCHE), controle)
+    return json.dumps(resultats, ensure_ascii=False)
+
+_GUICHET = None
+
+def guichet(recharger=False):
+    """GuichetExtraits de la session Pyodide (mode_api) sur les fichiers de INPUT_DIR ;
+    `recharger` après le dépôt de nouveaux classeurs ou modèles"""
+    global _GUICHET
+    if _GUICHET is None or recharger:
+        _, cache = contexte_pyodide()
+        _GUICHET = GuichetExtraits(fichiers_entree(INPUT_DIR), cache=cache,
+                                   rendu=globals().get('moteur_rendu', MOTEUR_RENDU),
+                                   modeles=file_travaux().modeles)
+    return _GUICHET
+
+def main():
+    log("[PYTHON] Démarrage du Python Engine...")
+    progression, cache = contexte_pyodide()
+    generer_extraits(fichiers_entree(INPUT_DIR), OUTPUT_DIR, progression=progression, cache=cache,
+                     arret_sur_anomalie=globals().get('arret_sur_anomalie', ARRET_SUR_ANOMALIE),
+                     rendu=globals().get('moteur_rendu', MOTEUR_RENDU), profilage=profilage_pyodide())
+
+async def main_async(controle=None):
+    """Pendant asynchrone de main() : à lancer par l'hôte avec pyodide.runPythonAsync (mode_api)"""
+    log("[PYTHON] Démarrage du Python Engine...")
+    progression, cache = contexte_pyodide()
+    return await generer_extraits_async(fichiers_entree(INPUT_DIR), OUTPUT_DIR,
+                                        globals().get('taille_tranche', TAILLE_TRANCHE), controle,
+                                        progression=progression, cache=cache,
+                                        arret_sur_anomalie=globals().get('arret_sur_anomalie', ARRET_SUR_ANOMALIE),
+                                        rendu=globals().get('moteur_rendu', MOTEUR_RENDU),
+                                        profilage=profilage_pyodide())
+
+def cli(argv=None):
+    """Point d'entrée natif (CPython) : chemins configurables et pool de processus"""
+    parser = argparse.ArgumentParser(description="Génération des extraits de délibération (mode natif)")
+    parser.add_argument("--entree", default=INPUT_DIR, help="Dossier contenant les fichiers d'entrée")
+    parser.add_argument("--sortie", default=OUTPUT_DIR, help="Dossier de l'archive résultat")
+    parser.add_argument("--nicad", action="append", default=[], metavar="NICAD",
+                        help="Réimprime cette parcelle seulement (répétable) : .docx écrits dans --sortie")
+    parser.add_argument("--village", help="Réimprime les parcelles de ce village : .docx écrits dans --sortie")
+    parser.add_argument("--reunis", action="store_true",
+                        help="Avec --nicad / --village : un seul document par type plutôt qu'un par parcelle")
+    parser.add_argument("--travaux", metavar="FICHIER",
+                        help="Liste JSON de communes à traiter à la suite ({entree, sortie, ...} chacune) ; "
+                             "les autres options s'appliquent à toutes")
+    for cle, nom in {**NOMS_FICHIERS, **NOMS_FICHIERS_OPTIONNELS}.items():
+        parser.add_argument(f"--{cle.replace('_', '-')}", dest=cle, help=f"Chemin explicite (défaut : <entree>/{nom})")
+    parser.add_argument("--processus", type=int, default=os.cpu_count() or 1,
+                        help="Nombre de processus de rendu (1 = séquentiel)")
+    parser.add_argument("--taille-lot", type=int, default=TAILLE_LOT, help="Parcelles par lot envoyé à un processus")
+    parser.add_argument("--compression", choices=sorted(SortieZip.MODES), default=COMPRESSION_ZIP)
+    parser.add_argument("--chargeur", choices=("leger", "pandas"), default=CHARGEUR,
+                        help="Lecture des classeurs : openpyxl seul (leger) ou pandas")
+    parser.add_argument("--rendu", choices=("docx", "xml"), default=MOTEUR_RENDU,
+                        help="Moteur de rendu : python-docx, ou XML direct (plus rapide, même résultat)")
+    parser.add_argument("--sans-fusion", dest="fusionner", action="store_false", default=FUSIONNER,
+                        help="Ne pas produire les documents TOUS_LES_EXTRAITS_*.docx")
+    parser.add_argument("--partition", metavar="COLONNE",
+                        help="Une archive par valeur de la colonne (ex. Village)")
+    parser.add_argument("--taille-max-archive", type=int, metavar="MO",
+                        help="Taille visée de chaque archive (Mo) : au-delà, une nouvelle archive est ouverte")
+    parser.add_argument("--tolerance-superficie", type=float, default=TOLERANCE_SUPERFICIE * 100, metavar="PCT",
+                        help="Écart toléré (%%) entre aire calculée et superficie déclarée (contrôle géométrique)")
+    parser.add_argument("--sans-controle-geometrie", action="store_true",
+                        help="Ne pas produire controle_geometrie.json")
+    parser.add_argument("--arret-sur-anomalie", action="store_true", default=ARRET_SUR_ANOMALIE,
+                        help="Refuser les données si le contrôle préalable trouve une anomalie bloquante")
+    parser.add_argument("--profil", action="store_true",
+                        help=f"Durées par étape et par parcelle, pic mémoire : {NOM_RAPPORT_PROFIL} dans l'archive")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="Profil cProfile de la boucle de rendu (implique --profil)")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Allocations Python de la boucle de rendu (implique --profil, ralentit le rendu)")
+    parser.add_argument("--profil-top", type=int, metavar="N",
+                        help=f"Parcelles et fonctions listées dans le profil (défaut {TOP_PROFIL}, implique --profil)")
+    parser.add_argument("--evenements", metavar="FICHIER",
+                        help="Écrit les événements de progression en JSON, une ligne chacun ('-' : stderr)")
+    parser.add_argument("--cadence", type=float, default=CADENCE_PROGRESSION,
+                        help="Secondes minimum entre deux événements de progression")
+    parser.add_argument("--cache", default=DOSSIER_CACHE, help="Dossier du cache des classeurs analysés")
+    parser.add_argument("--taille-cache", type=int, default=TAILLE_MAX_CACHE_MO, help="Taille maximale du cache (Mo)")
+    parser.add_argument("--sans-cache", action="store_true", help="Toujours relire les classeurs")
+    args = parser.parse_args(argv)
+
+    chemins = {cle: getattr(args, cle) for cle in {**NOMS_FICHIERS, **NOMS_FICHIERS_OPTIONNELS}}
+    log("[PYTHON] Démarrage du Python Engine (natif)...")
+    with contextlib.ExitStack() as pile:
+        progression = None
+        if args.evenements:
+            flux = sys.stderr if args.evenements == "-" else pile.enter_context(
+                open(args.evenements, "w", encoding="utf-8"))
+            progression = Progression(rappel_json(flux), args.cadence)
+        cache = None if args.sans_cache else CacheEntrees(args.cache, args.taille_cache * 1024 * 1024)
+        profilage = None
+        if args.profil or args.cprofile or args.tracemalloc or args.profil_top:
+            profilage = Profilage(args.cprofile, args.tracemalloc, args.profil_top or TOP_PROFIL)
+        options = dict(processus=max(1, args.processus), taille_lot=max(1, args.taille_lot),
+                       compression=args.compression, chargeur=args.chargeur, fusionner=args.fusionner,
+                       partition=args.partition,
+                       taille_max_archive=args.taille_max_archive and args.taille_max_archive * 1024 * 1024,
+                       tolerance_superficie=None if args.sans_controle_geometrie else args.tolerance_superficie / 100,
+                       arret_sur_anomalie=args.arret_sur_anomalie, rendu=args.rendu)
+        try:
+            if args.nicad or args.village:
+                guichet = GuichetExtraits(fichiers_entree(args.entree, **chemins), args.chargeur, cache, args.rendu)
+                documents = (guichet.reunis(args.nicad, args.village) if args.reunis
+                             else dict(guichet.extraits(args.nicad, args.village)))
+                os.makedirs(args.sortie, exist_ok=True)
+                for nom, octets in documents.items():
+                    with open(os.path.join(args.sortie, os.path.basename(nom)), 'wb') as f:
+                        f.write(octets)
+                log(f"✅ {len(documents)} documents écrits dans {args.sortie}")
+                return 0
+            if args.travaux:
+                with open(args.travaux, encoding="utf-8") as f:
+                    travaux = lire_travaux(f)
+                file = FileTravaux(progression, cache, profilage, **options)
+                for travail in travaux:
+                    file.ajouter(**travail)
+                resultats = file.executer()
+                return 2 if any(resultat['erreur'] for resultat in resultats) else 0
+            generer_extraits(fichiers_entree(args.entree, **chemins), args.sortie, progression=progression,
+                             cache=cache, profilage=profilage, **options)
+        except ValueError as e:
+            log(f"❌ {e}")
+            return 2
+    return 0
 
-# Appel principal
-main()
+# Appel principal : exécution directe sous Pyodide (sauf si l'hôte pose `mode_api` pour
+# piloter lui-même iter_extraits / generer_extraits), ligne de commande en natif
+if sys.platform == "emscripten":
+    if not globals().get('mode_api'):
+        main()
+elif __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,110 @@
+"""
+Vérifie le rendu XML direct du moteur Python (public/python/generate_web.py) contre le rendu python-docx
+Chaque extrait est rendu par les deux moteurs et comparé partie par partie, valeurs limites comprises
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+from create_demo_data import generer_commune
+
+RACINE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(RACINE, "public", "python"))
+
+import generate_web as gw  # noqa: E402
+
+# Valeurs qui sollicitent l'échappement, les espaces, les sauts de ligne et les replis vers python-docx
+CAS_LIMITES = ("", "  espaces autour  ", "A & B <c> \"d\" 'e'", "ligne 1\nligne 2", "avec\ttabulation",
+               "deux : points", "FAIT LE 01/01/2024", "é ü ß 漢字 😀", "fin\r", "contrôle\x01")
+
+def enregistrements_limites(donnees):
+    """Variantes du premier enregistrement de chaque type : chaque champ reçoit chaque valeur limite"""
+    variantes = []
+    for type_extrait in ('PI', 'PC'):
+        if not donnees[type_extrait]:
+            continue
+        base = donnees[type_extrait][0]
+        for i in range(1, len(base)):
+            for valeur in CAS_LIMITES:
+                variantes.append((type_extrait, base[:i] + (valeur,) + base[i + 1:]))
+        # Parcelle sans sommets : tableau des coordonnées laissé tel quel
+        variantes.append((type_extrait, ("SANS_SOMMETS",) + base[1:]))
+    return variantes
+
+def rendre(moteur, type_extrait, enreg):
+    try:
+        return moteur.rendre_octets(type_extrait, enreg)[1], None
+    except Exception as e:
+        return None, str(e)
+
+def differences(attendu, obtenu):
+    """Parties différentes (ou manquantes) entre deux .docx"""
+    with zipfile.ZipFile(io.BytesIO(attendu)) as a, zipfile.ZipFile(io.BytesIO(obtenu)) as b:
+        if a.namelist() != b.namelist():
+            return ["<liste des parties>"]
+        return [nom for nom in a.namelist() if a.read(nom) != b.read(nom)]
+
+def verifier(dossier):
+    fichiers = gw.fichiers_entree(dossier)
+    donnees = gw.charger_donnees(fichiers)
+    moteur_docx = gw.Moteur(gw.ModeleCompile(fichiers['tpl_indiv']), gw.ModeleCompile(fichiers['tpl_coll']),
+                            donnees['index_pi'], donnees['index_pc'])
+    moteur_xml = gw.Moteur(gw.ModeleCompile(fichiers['tpl_indiv']), gw.ModeleCompile(fichiers['tpl_coll']),
+                           donnees['index_pi'], donnees['index_pc'], rendu="xml")
+
+    taches = [(type_extrait, enreg) for type_extrait in ('PI', 'PC') for enreg in donnees[type_extrait]]
+    limites = enregistrements_limites(donnees)
+    ecarts = 0
+    durees = {'docx': 0.0, 'xml': 0.0}
+    for i, (type_extrait, enreg) in enumerate(taches + limites):
+        limite = i >= len(taches)
+        debut = time.perf_counter()
+        attendu, erreur_attendue = rendre(moteur_docx, type_extrait, enreg)
+        milieu = time.perf_counter()
+        obtenu, erreur_obtenue = rendre(moteur_xml, type_extrait, enreg)
+        if not limite:
+            durees['docx'] += milieu - debut
+            durees['xml'] += time.perf_counter() - milieu
+
+        if attendu is None or obtenu is None:
+            if (erreur_attendue is None) != (erreur_obtenue is None):
+                ecarts += 1
+                print(f"   ❌ {type_extrait} {enreg[0]} : docx={erreur_attendue!r} xml={erreur_obtenue!r}")
+            continue
+        parties = differences(attendu, obtenu)
+        if parties:
+            ecarts += 1
+            print(f"   ❌ {type_extrait} {enreg[0]}{' (valeurs limites)' if limite else ''} : {', '.join(parties)}")
+
+    nb = len(taches)
+    print(f"   ✓ {nb} extraits + {len(limites)} variantes limites comparés, {ecarts} écarts, "
+          f"{moteur_xml.nb_replis} replis vers python-docx")
+    if nb and durees['xml']:
+        print(f"   ⏱️  docx {durees['docx'] / nb * 1000:.1f} ms/extrait, xml {durees['xml'] / nb * 1000:.2f} ms/extrait "
+              f"({durees['docx'] / durees['xml']:.0f}x)")
+    return ecarts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parité du rendu XML direct avec le rendu python-docx")
+    parser.add_argument("--entree", action="append",
+                        help="Dossier d'entrée à vérifier (répétable) ; défaut : commune de démonstration")
+    parser.add_argument("--parcelles", type=int, default=60, help="Taille de la commune de démonstration")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporaire:
+        dossiers = args.entree
+        if not dossiers:
+            nb_coll = args.parcelles // 5
+            # Jusqu'à 40 sommets : les trois dispositions du tableau des coordonnées
+            dossiers = [generer_commune(temporaire, args.parcelles - nb_coll, nb_coll, (3, 12, 40), modeles=RACINE)]
+        ecarts = 0
+        for dossier in dossiers:
+            print(f"🔎 {dossier}")
+            ecarts += verifier(dossier)
+    print("✅ Rendu XML identique" if not ecarts else f"❌ {ecarts} écarts")
+    sys.exit(1 if ecarts else 0)